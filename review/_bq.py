@@ -0,0 +1,98 @@
+"""
+Cliente de BigQuery compartido por los scripts de debug
+"""
+
+import os
+import warnings
+from functools import lru_cache
+
+from google.api_core.client_info import ClientInfo
+from google.cloud import bigquery
+from requests.adapters import HTTPAdapter
+from config import PROJECT_SOURCE
+
+# Conexiones HTTP keep-alive por host (el default de requests es 10).
+# Debe cubrir los hilos que consultan en paralelo con el mismo cliente.
+HTTP_POOL_SIZE = int(os.getenv("BQ_CONNECTION_POOL_SIZE", 32))
+
+# User agent de los jobs lanzados por estos scripts (identificable en cuotas y auditoría)
+USER_AGENT = "ccpd-review-scripts"
+
+# Límites de las consultas a INFORMATION_SCHEMA: un dataset lento falla rápido
+# en lugar de bloquear el resto de la ejecución
+METADATA_MAX_BYTES_BILLED = 10**9
+METADATA_JOB_TIMEOUT_MS = 15000
+
+# Nombres legacy de SchemaField.field_type -> tipos de GoogleSQL (los de INFORMATION_SCHEMA)
+STANDARD_SQL_TYPES = {
+    'INTEGER': 'INT64',
+    'FLOAT': 'FLOAT64',
+    'BOOLEAN': 'BOOL',
+    'RECORD': 'STRUCT',
+}
+
+
+def get_client(project=None):
+    """Retorna un único bigquery.Client por proyecto y proceso con el pool HTTP ampliado"""
+    return _client_for(project or PROJECT_SOURCE)
+
+
+@lru_cache(maxsize=None)
+def _client_for(project):
+    # Solo se silencia el aviso de google.auth por credenciales de usuario (ADC),
+    # esperado al ejecutar desde Cloud Shell o en local
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='Your application has authenticated using end user credentials', category=UserWarning)
+        client = bigquery.Client(project=project, client_info=ClientInfo(user_agent=USER_AGENT))
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=3)
+    client._http.mount('https://', adapter)
+    return client
+
+
+def metadata_job_config(query_parameters=()):
+    """QueryJobConfig para consultas de metadata, con tope de bytes y de tiempo"""
+    return bigquery.QueryJobConfig(
+        query_parameters=list(query_parameters),
+        use_query_cache=True,
+        maximum_bytes_billed=METADATA_MAX_BYTES_BILLED,
+        job_timeout_ms=METADATA_JOB_TIMEOUT_MS,
+        labels={"source": "review-scripts"}
+    )
+
+
+@lru_cache(maxsize=None)
+def fetch_columns(project_id, dataset):
+    """Retorna todo INFORMATION_SCHEMA.COLUMNS de un dataset (una consulta por dataset y proceso).
+
+    El DataFrame se comparte entre llamadas: filtrarlo, no modificarlo.
+    """
+    query = f"""
+        SELECT
+            table_name,
+            column_name,
+            data_type,
+            ordinal_position
+        FROM `{project_id}.{dataset}.INFORMATION_SCHEMA.COLUMNS`
+        ORDER BY table_name, ordinal_position
+    """
+    return get_client().query(query, job_config=metadata_job_config()).to_dataframe(create_bqstorage_client=True)
+
+
+def schema_columns(table):
+    """Retorna las columnas de un bigquery.Table con la forma de INFORMATION_SCHEMA.COLUMNS.
+
+    Usa el esquema que ya trae tables.get, sin lanzar un job de consulta.
+    Los STRUCT se reportan sin sus subcampos.
+    """
+    columns = []
+    for position, field in enumerate(table.schema, 1):
+        data_type = STANDARD_SQL_TYPES.get(field.field_type, field.field_type)
+        if field.mode == 'REPEATED':
+            data_type = f"ARRAY<{data_type}>"
+        columns.append({
+            'column_name': field.name,
+            'data_type': data_type,
+            'is_nullable': 'YES' if field.is_nullable else 'NO',
+            'ordinal_position': position,
+        })
+    return columns
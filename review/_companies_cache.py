@@ -0,0 +1,67 @@
+"""
+Cache local (parquet con TTL) de la lista de compañías activas compartido por los scripts de debug
+"""
+
+import os
+import time
+import zlib
+from pathlib import Path
+
+import pandas as pd
+from _bq import get_client
+from config import PROJECT_SOURCE, DATASET_NAME
+
+CACHE_DIR = Path.home() / ".cache" / "ccpd"
+
+COMPANIES_QUERY = f"""
+    SELECT
+        company_id,
+        company_name,
+        company_project_id
+    FROM `{PROJECT_SOURCE}.{DATASET_NAME}.companies`
+    WHERE company_fivetran_status = TRUE
+      AND company_bigquery_status = TRUE
+      AND company_project_id IS NOT NULL
+    ORDER BY company_id
+"""
+
+
+def load_companies(ttl_sec=3600, refresh=False):
+    """Retorna las compañías activas, re-consultando BigQuery solo si el cache expiró.
+
+    Incluye la columna `dataset_name` (servicetitan_<project_id> con '_').
+    """
+    return _with_dataset_name(load_query_cached("companies", COMPANIES_QUERY, ttl_sec, refresh))
+
+
+def load_query_cached(name, query, ttl_sec=3600, refresh=False):
+    """Retorna el resultado de una consulta desde el parquet local si no expiró.
+
+    El nombre del archivo lleva el CRC32 de la consulta, así que un cambio en
+    la consulta invalida el cache. refresh=True o CCPD_CACHE_BUST=1 fuerzan
+    la re-consulta.
+    """
+    cache_file = CACHE_DIR / f"{name}_{zlib.crc32(query.encode()):08x}.parquet"
+
+    if not refresh and os.getenv("CCPD_CACHE_BUST") != "1":
+        try:
+            if time.time() - cache_file.stat().st_mtime < ttl_sec:
+                return pd.read_parquet(cache_file)
+        except (OSError, ValueError):
+            pass
+
+    result_df = get_client().query(query).to_dataframe(create_bqstorage_client=True)
+
+    # Escritura atómica: otro proceso nunca ve un parquet a medio escribir
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    result_df.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, cache_file)
+
+    return result_df
+
+
+def _with_dataset_name(companies_df):
+    # Dataset bronze de cada compañía (operación vectorizada, no por fila)
+    companies_df['dataset_name'] = 'servicetitan_' + companies_df['company_project_id'].str.replace('-', '_', regex=False)
+    return companies_df
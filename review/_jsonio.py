@@ -0,0 +1,48 @@
+"""
+Lectura y escritura JSON/JSONL compartida por los gestores de ejecución, monitoreo y rollback
+"""
+
+import json
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional; se usa json estándar como respaldo
+    orjson = None
+
+
+def _default(obj):
+    # Tipos no nativos (Path, enteros numpy, ...) en ambos caminos; datetime en ISO 8601 como orjson
+    return obj.isoformat() if isinstance(obj, datetime) else str(obj)
+
+
+def write_json(obj, path):
+    """Escribe un JSON legible (orjson si está disponible)"""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, default=_default, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False, default=_default)
+
+
+def dump_json_line(obj):
+    """Serializa un objeto como una línea JSONL compacta (bytes)
+
+    Sin espacios tras ':' en ninguno de los dos caminos: rollback_manager cuenta
+    los status buscando b'"status":"SUCCESS"' en cada línea.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS) + b'\n'
+    return (json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default) + '\n').encode('utf-8')
+
+
+def loads_json(data):
+    """Parsea JSON desde bytes o str (orjson si está disponible)"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def read_json(path):
+    """Lee un archivo JSON (orjson si está disponible)"""
+    with open(path, 'rb') as f:
+        return loads_json(f.read())
@@ -0,0 +1,142 @@
+"""
+Funciones compartidas por los scripts de prueba de vistas Silver
+(analyze_data_types.py y test_single_table_analysis.py)
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from google.api_core.exceptions import GoogleAPICallError, NotFound
+from google.cloud import bigquery
+from _bq import get_client, metadata_job_config, schema_columns
+from _companies_cache import load_query_cached
+from config import PROJECT_SOURCE, DATASET_NAME, TABLE_NAME
+
+# Compañías analizadas por defecto en las pruebas
+MAX_COMPANIES_FOR_TEST = 5
+
+# Consultas de metadata concurrentes cuando el lote UNION ALL no es viable
+MAX_THREADS = 8
+
+# Vigencia del cache de campos por (proyecto, tabla) dentro del proceso
+FIELDS_CACHE_TTL_SEC = 300
+
+# Campos del ETL que deben quedarse solo en Bronze
+FIVETRAN_PREFIX = '_fivetran'
+
+
+def bronze_dataset(project_id):
+    """Dataset Bronze de una compañía: servicetitan_<project_id> con '_'"""
+    return f"servicetitan_{project_id.replace('-', '_')}"
+
+
+def get_companies_info(max_companies=MAX_COMPANIES_FOR_TEST, refresh=False):
+    """Obtiene información de las compañías activas (cache parquet local con TTL)
+
+    max_companies=None trae todas las compañías.
+    """
+    limit_clause = f"LIMIT {int(max_companies)}" if max_companies is not None else ""
+    query = f"""
+        SELECT company_id, company_name, company_project_id
+        FROM `{PROJECT_SOURCE}.{DATASET_NAME}.{TABLE_NAME}`
+        WHERE company_bigquery_status IS NOT NULL
+        ORDER BY company_id
+        {limit_clause}
+    """
+    return load_query_cached("companies_test", query, refresh=refresh)
+
+
+def get_table_fields_with_types(project_id, table_name):
+    """Retorna [(column_name, data_type, is_nullable, ordinal_position)] de la tabla; [] si no existe
+
+    Excluye los campos _fivetran. Los resultados se cachean FIELDS_CACHE_TTL_SEC por (proyecto, tabla).
+    """
+    dataset_name = bronze_dataset(project_id)
+    try:
+        return list(_fetch_table_fields(project_id, dataset_name, table_name, int(time.monotonic() // FIELDS_CACHE_TTL_SEC)))
+    except Exception as e:
+        print(f"  ⚠️  Error obteniendo campos de {project_id}.{dataset_name}.{table_name}: {str(e)}")
+        return []
+
+
+def clear_fields_cache():
+    """Descarta los campos cacheados (útil al re-ejecutar en un notebook)"""
+    _fetch_table_fields.cache_clear()
+
+
+@lru_cache(maxsize=1024)
+def _fetch_table_fields(project_id, dataset_name, table_name, ttl_bucket):
+    # ttl_bucket cambia cada FIELDS_CACHE_TTL_SEC y deja sin uso las entradas anteriores.
+    # Una tabla inexistente se cachea como vacía; los demás errores se propagan y no se cachean.
+    # tables.get es una llamada REST de metadata: sin job ni mínimo facturado de INFORMATION_SCHEMA
+    try:
+        table = get_client().get_table(f"{project_id}.{dataset_name}.{table_name}")
+    except NotFound:
+        return ()
+    return tuple(
+        tuple(column.values()) for column in schema_columns(table)
+        if not column['column_name'].startswith(FIVETRAN_PREFIX)
+    )
+
+
+def get_all_table_fields(companies_df, table_name):
+    """Obtiene campos con sus tipos de la tabla en todas las compañías con un solo job UNION ALL
+
+    Retorna {company_id: [(column_name, data_type, is_nullable, ordinal_position)]};
+    las compañías sin la tabla no aparecen. Los campos _fivetran se excluyen en la consulta.
+    Si el lote falla (p.ej. un dataset inexistente), se consulta por compañía.
+    """
+    if companies_df.empty:
+        return {}
+
+    query = "\nUNION ALL\n".join(
+        f"""
+        SELECT {company_id} AS company_id, column_name, data_type, is_nullable, ordinal_position
+        FROM `{project_id}.{bronze_dataset(project_id)}.INFORMATION_SCHEMA.COLUMNS`
+        WHERE table_name = @table_name
+          AND NOT STARTS_WITH(column_name, @fivetran_prefix)
+        """
+        for company_id, project_id in zip(companies_df['company_id'], companies_df['company_project_id'])
+    ) + "\nORDER BY company_id, ordinal_position"
+    # La tabla va como parámetro: el texto de la consulta solo depende de las compañías,
+    # así que se repite entre tablas y ejecuciones y puede aprovechar el cache de BigQuery
+    job_config = metadata_job_config([
+        bigquery.ScalarQueryParameter("table_name", "STRING", table_name),
+        bigquery.ScalarQueryParameter("fivetran_prefix", "STRING", FIVETRAN_PREFIX),
+    ])
+
+    try:
+        all_fields_df = get_client().query(query, job_config=job_config).to_dataframe(create_bqstorage_client=True)
+    except Exception as e:
+        print(f"⚠️  Consulta en lote falló, consultando por compañía: {str(e)}")
+        fields_by_company = {}
+        # Las consultas son I/O contra BigQuery: se ejecutan en paralelo con el mismo cliente
+        with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
+            futures = {
+                executor.submit(get_table_fields_with_types, project_id, table_name): company_id
+                for company_id, project_id in zip(companies_df['company_id'], companies_df['company_project_id'])
+            }
+            for future in as_completed(futures):
+                columns = future.result()
+                if columns:
+                    fields_by_company[futures[future]] = columns
+        return fields_by_company
+
+    fields_by_company = {}
+    for company_id, *column in all_fields_df.itertuples(index=False, name=None):
+        fields_by_company.setdefault(company_id, []).append(tuple(column))
+    return fields_by_company
+
+
+def dry_run_sql(sql):
+    """Valida un SQL con un dry run de BigQuery (sin costo, no ejecuta nada)
+
+    Retorna (bytes_estimados, None) si es válido o (None, error) si BigQuery lo rechaza.
+    """
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    try:
+        job = get_client().query(sql, job_config=job_config)
+    except GoogleAPICallError as e:
+        return None, str(e)
+    return job.total_bytes_processed or 0, None
@@ -6,11 +6,9 @@ Este script analiza las diferencias de tipos de datos entre compañías
 para las mismas tablas y genera la normalización apropiada con CAST.
 """
 
-from google.cloud import bigquery
-import pandas as pd
+import argparse
 from datetime import datetime
-import warnings
-from collections import defaultdict, Counter
+from collections import defaultdict
 import sys
 import os
 
@@ -18,59 +16,12 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import *
+from _silver_common import (
+    MAX_COMPANIES_FOR_TEST, bronze_dataset, clear_fields_cache, dry_run_sql,
+    get_companies_info, get_table_fields_with_types, get_all_table_fields
+)
 
-warnings.filterwarnings('ignore')
-
-print("✅ Librerías importadas correctamente")
-
-# Crear cliente de BigQuery
-try:
-    client = bigquery.Client(project=PROJECT_SOURCE)
-    print(f"✅ Cliente BigQuery creado exitosamente para proyecto: {PROJECT_SOURCE}")
-except Exception as e:
-    print(f"❌ Error al crear cliente BigQuery: {str(e)}")
-    raise
-
-def get_companies_info():
-    """Obtiene información de las compañías activas"""
-    try:
-        query = f"""
-            SELECT company_id, company_name, company_project_id
-            FROM `{PROJECT_SOURCE}.{DATASET_NAME}.{TABLE_NAME}`
-            WHERE company_bigquery_status IS NOT NULL
-            ORDER BY company_id
-            LIMIT {MAX_COMPANIES_FOR_TEST}  # Limitar para prueba
-        """
-        print(f"🔍 Ejecutando consulta: {query}")
-        result = client.query(query).result()
-        companies_df = pd.DataFrame([dict(row) for row in result])
-        print(f"✅ Obtenidas {len(companies_df)} compañías")
-        return companies_df
-    except Exception as e:
-        print(f"❌ Error obteniendo información de compañías: {str(e)}")
-        return pd.DataFrame()
-
-def get_table_fields_with_types(project_id, table_name):
-    """Obtiene campos con sus tipos de datos de una tabla específica"""
-    dataset_name = f"servicetitan_{project_id.replace('-', '_')}"
-    query = f"""
-        SELECT 
-            column_name, 
-            data_type, 
-            is_nullable, 
-            ordinal_position,
-            column_default
-        FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.COLUMNS`
-        WHERE table_name = '{table_name}'
-        ORDER BY ordinal_position
-    """
-    try:
-        return pd.DataFrame([dict(row) for row in client.query(query).result()])
-    except Exception as e:
-        print(f"⚠️  Error obteniendo campos de {project_id}.{dataset_name}.{table_name}: {str(e)}")
-        return pd.DataFrame()
-
-def analyze_table_data_types(table_name):
+def analyze_table_data_types(table_name, max_companies=MAX_COMPANIES_FOR_TEST):
     """
     Analiza las diferencias de tipos de datos para una tabla específica
     """
@@ -78,7 +29,7 @@ def analyze_table_data_types(table_name):
     print("=" * 80)
     
     try:
-        companies_df = get_companies_info()
+        companies_df = get_companies_info(max_companies)
         
         if companies_df.empty:
             print("❌ No se pudieron obtener las compañías")
@@ -90,38 +41,44 @@ def analyze_table_data_types(table_name):
         print(f"❌ Error en análisis inicial: {str(e)}")
         return None
     
-    field_type_analysis = defaultdict(list)
-    field_presence = Counter()
+    # Por campo: tipos distintos (se deduplican al recopilar) y detalle por compañía
+    field_type_analysis = defaultdict(lambda: {'types': set(), 'companies': []})
+    
+    # Compañías que tienen la tabla, con las claves que usa generate_enhanced_silver_view_sql
+    results = []
+    
+    # Campos de todas las compañías en un solo job de metadata (sin campos _fivetran)
+    fields_by_company = get_all_table_fields(companies_df, table_name)
     
     # Recopilar información de tipos por campo
     for _, company in companies_df.iterrows():
         project_id = company['company_project_id']
         company_name = company['company_name']
         
-        fields_df = get_table_fields_with_types(project_id, table_name)
+        columns = fields_by_company.get(company['company_id'])
         
-        if fields_df.empty:
+        if columns is None:
             print(f"  ⚠️  {company_name}: Tabla '{table_name}' no encontrada")
             continue
         
-        print(f"  ✅ {company_name}: {len(fields_df)} campos")
-        
-        # Filtrar campos _fivetran (campos del ETL que deben quedarse solo en Bronze)
-        filtered_fields_df = fields_df[~fields_df['column_name'].str.startswith('_fivetran')]
+        print(f"  ✅ {company_name}: {len(columns)} campos")
+        results.append({
+            'company_name': company_name,
+            'project_id': project_id,
+            'field_count': len(columns),
+            'columns': columns
+        })
         
         # Analizar cada campo
-        for _, field in filtered_fields_df.iterrows():
-            field_name = field['column_name']
-            data_type = field['data_type']
-            
-            field_type_analysis[field_name].append({
+        for field_name, data_type, is_nullable, _ in columns:
+            field_info = field_type_analysis[field_name]
+            field_info['types'].add(data_type)
+            field_info['companies'].append({
                 'company_name': company_name,
                 'project_id': project_id,
                 'data_type': data_type,
-                'is_nullable': field['is_nullable']
+                'is_nullable': is_nullable
             })
-            
-            field_presence[field_name] += 1
     
     if not field_type_analysis:
         print(f"  ❌ No se encontraron datos para la tabla '{table_name}'")
@@ -135,9 +92,9 @@ def analyze_table_data_types(table_name):
     print(f"  Total de campos únicos: {len(field_type_analysis)}")
     print(f"  Compañías analizadas: {len(companies_df)}")
     
-    for field_name, type_info_list in field_type_analysis.items():
-        # Obtener tipos únicos para este campo
-        unique_types = list(set([info['data_type'] for info in type_info_list]))
+    for field_name, field_info in field_type_analysis.items():
+        unique_types = list(field_info['types'])
+        type_info_list = field_info['companies']
         
         if len(unique_types) > 1:
             # Hay conflicto de tipos
@@ -167,6 +124,7 @@ def analyze_table_data_types(table_name):
     
     return {
         'table_name': table_name,
+        'results': results,
         'total_fields': len(field_type_analysis),
         'field_consensus': field_consensus,
         'type_conflicts': type_conflicts,
@@ -262,9 +220,13 @@ def generate_enhanced_silver_view_sql(table_analysis, company_result):
     company_name = company_result['company_name']
     project_id = company_result['project_id']
     
-    # Obtener campos de esta compañía
-    company_fields_df = get_table_fields_with_types(project_id, table_name)
-    company_fields = {row['column_name']: row['data_type'] for _, row in company_fields_df.iterrows()}
+    # Campos de esta compañía: los mismos del análisis (INFORMATION_SCHEMA.COLUMNS),
+    # así los tipos parametrizados y STRUCT<...> se comparan contra la misma fuente.
+    # Solo si el resultado no los trae se consultan por compañía
+    columns = company_result.get('columns')
+    if columns is None:
+        columns = get_table_fields_with_types(project_id, table_name)
+    company_fields = {column_name: data_type for column_name, data_type, *_ in columns}
     
     silver_fields = []
     
@@ -314,8 +276,9 @@ def generate_enhanced_silver_view_sql(table_analysis, company_result):
             silver_fields.append(f"    '{company_name}' as {metadata_field}")
     
     # Crear SQL
-    dataset_name = f"servicetitan_{project_id.replace('-', '_')}"
+    dataset_name = bronze_dataset(project_id)
     view_name = f"vw_{table_name}"
+    select_list = ",\n".join(silver_fields)
     
     sql = f"""-- Vista Silver para {company_name} - Tabla {table_name}
 -- Generada automáticamente el {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
@@ -323,64 +286,74 @@ def generate_enhanced_silver_view_sql(table_analysis, company_result):
 
 CREATE OR REPLACE VIEW `{project_id}.silver.{view_name}` AS (
 SELECT
-{chr(10).join(silver_fields)}
+{select_list}
 FROM `{project_id}.{dataset_name}.{table_name}`
 );
 """
     
     return sql
 
-def test_data_type_analysis():
+def test_data_type_analysis(test_table='call', max_companies=MAX_COMPANIES_FOR_TEST):
     """
     Función de prueba para analizar tipos de datos
     """
     print("🧪 PRUEBA DE ANÁLISIS DE TIPOS DE DATOS")
     print("=" * 60)
     
-    # Probar con tabla 'call' que ya conoces
-    test_table = 'call'
-    
-    analysis_result = analyze_table_data_types(test_table)
+    analysis_result = analyze_table_data_types(test_table, max_companies)
     
     if analysis_result:
         print(f"\n✅ ANÁLISIS COMPLETADO PARA: {test_table}")
         
-        # Generar SQL de ejemplo
-        companies_df = get_companies_info()
-        if not companies_df.empty:
-            first_company = companies_df.iloc[0]
-            
-            print(f"\n🔧 SQL DE EJEMPLO PARA: {first_company['company_name']}")
-            print("=" * 60)
-            
-            sql_example = generate_enhanced_silver_view_sql(analysis_result, first_company)
-            print(sql_example)
-            
-            # Guardar en archivo
-            with open(f"test_{test_table}_enhanced_silver_view.sql", 'w') as f:
-                f.write(sql_example)
-            
-            print(f"\n💾 SQL guardado en: test_{test_table}_enhanced_silver_view.sql")
+        # Generar SQL de ejemplo para la primera compañía que tiene la tabla
+        first_company = analysis_result['results'][0]
+        
+        print(f"\n🔧 SQL DE EJEMPLO PARA: {first_company['company_name']}")
+        print("=" * 60)
+        
+        sql_example = generate_enhanced_silver_view_sql(analysis_result, first_company)
+        print(sql_example)
+        
+        # Guardar en archivo
+        with open(f"test_{test_table}_enhanced_silver_view.sql", 'w') as f:
+            f.write(sql_example)
+        
+        print(f"\n💾 SQL guardado en: test_{test_table}_enhanced_silver_view.sql")
+        
+        # Validar el SQL generado antes de aplicarlo en producción (dry run, sin costo)
+        bytes_processed, error = dry_run_sql(sql_example)
+        if error is None:
+            print(f"✅ SQL válido (dry run): {bytes_processed:,} bytes estimados")
+        else:
+            print(f"❌ SQL inválido (dry run): {error}")
         
         return analysis_result
     else:
         print(f"❌ No se pudo analizar la tabla '{test_table}'")
         return None
 
-def main():
-    """Función principal para ejecutar análisis de tipos de datos"""
+def main(test_table='call', max_companies=MAX_COMPANIES_FOR_TEST, refresh=False):
+    """Función principal para ejecutar análisis de tipos de datos
+    
+    refresh=True descarta los campos cacheados y re-consulta las compañías.
+    """
     try:
         print("🔍 Iniciando análisis de tipos de datos...")
         
+        if refresh:
+            clear_fields_cache()
+            # Re-consulta las compañías; las llamadas siguientes leen el cache ya actualizado
+            get_companies_info(max_companies, refresh=True)
+        
         # Verificar configuración
         print(f"📋 Configuración:")
         print(f"  - Proyecto fuente: {PROJECT_SOURCE}")
         print(f"  - Dataset: {DATASET_NAME}")
         print(f"  - Tabla: {TABLE_NAME}")
-        print(f"  - Límite compañías: {MAX_COMPANIES_FOR_TEST}")
+        print(f"  - Límite compañías: {max_companies or 'sin límite'}")
         
         # Ejecutar análisis de prueba
-        result = test_data_type_analysis()
+        result = test_data_type_analysis(test_table, max_companies)
         
         if result:
             print(f"\n🎯 ANÁLISIS COMPLETADO")
@@ -404,4 +377,10 @@ def main():
         return False
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Analiza diferencias de tipos de datos de una tabla entre compañías")
+    parser.add_argument("table", nargs="?", default="call", help="Tabla a analizar (default: call)")
+    parser.add_argument("--all-companies", action="store_true", help=f"Analizar todas las compañías, no solo las primeras {MAX_COMPANIES_FOR_TEST}")
+    parser.add_argument("--refresh", action="store_true", help="Ignorar los caches de compañías y campos")
+    args = parser.parse_args()
+    
+    main(args.table, None if args.all_companies else MAX_COMPANIES_FOR_TEST, args.refresh)
@@ -3,6 +3,7 @@
 Script para verificar dónde están los metadatos de consolidated_tables
 """
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.cloud import bigquery
 
 # Proyectos posibles
@@ -15,51 +16,71 @@ projects = [
 
 client = bigquery.Client()
 
-print("🔍 BUSCANDO TABLA metadata_consolidated_tables")
-print("=" * 80)
 
-for project in projects:
+def check_project(project):
+    """Consulta total y primeras 5 tablas activas en un solo job; retorna las líneas a imprimir"""
     table_path = f"{project}.management.metadata_consolidated_tables"
-    print(f"\n📋 Verificando: {table_path}")
+    lines = [f"\n📋 Verificando: {table_path}"]
     
     try:
-        # Intentar contar registros
+        # Verificar existencia con metadata (sin escanear datos) antes de consultar la tabla
+        exists_query = f"""
+            SELECT table_name
+            FROM `{project}.management.INFORMATION_SCHEMA.TABLES`
+            WHERE table_name = 'metadata_consolidated_tables'
+        """
+        if not list(client.query(exists_query).result()):
+            lines.append(f"   ❌ NO EXISTE")
+            return lines
+        
         query = f"""
-            SELECT COUNT(*) as total
-            FROM `{table_path}`
-            WHERE is_active = TRUE
+            SELECT
+                (SELECT COUNT(*) FROM `{table_path}` WHERE is_active = TRUE) AS total,
+                ARRAY(
+                    SELECT AS STRUCT table_name, partition_fields, cluster_fields
+                    FROM `{table_path}`
+                    WHERE is_active = TRUE
+                    ORDER BY table_name
+                    LIMIT 5
+                ) AS sample
         """
         
-        result = client.query(query).result()
-        total = list(result)[0].total
+        row = list(client.query(query).result())[0]
         
-        print(f"   ✅ ENCONTRADA: {total} tablas activas")
+        lines.append(f"   ✅ ENCONTRADA: {row.total} tablas activas")
         
         # Mostrar primeras 5 tablas
-        query2 = f"""
-            SELECT table_name, partition_fields, cluster_fields
-            FROM `{table_path}`
-            WHERE is_active = TRUE
-            ORDER BY table_name
-            LIMIT 5
-        """
-        
-        result2 = client.query(query2).result()
-        print(f"   📋 Primeras 5 tablas:")
-        for row in result2:
-            print(f"      - {row.table_name}: partition={row.partition_fields}, cluster={row.cluster_fields}")
+        lines.append(f"   📋 Primeras 5 tablas:")
+        for table in row.sample:
+            lines.append(f"      - {table['table_name']}: partition={table['partition_fields']}, cluster={table['cluster_fields']}")
         
     except Exception as e:
         error_msg = str(e)
         if "Not found" in error_msg or "does not exist" in error_msg:
-            print(f"   ❌ NO EXISTE")
+            lines.append(f"   ❌ NO EXISTE")
         elif "Access Denied" in error_msg or "Permission denied" in error_msg:
-            print(f"   ⚠️  SIN PERMISOS")
+            lines.append(f"   ⚠️  SIN PERMISOS")
         else:
-            print(f"   ❌ Error: {error_msg[:100]}")
+            lines.append(f"   ❌ Error: {error_msg[:100]}")
+    
+    return lines
+
+
+print("🔍 BUSCANDO TABLA metadata_consolidated_tables")
+print("=" * 80)
+
+# Un job por proyecto, todos en paralelo
+with ThreadPoolExecutor(max_workers=len(projects)) as executor:
+    futures = {executor.submit(check_project, project): project for project in projects}
+    output = {}
+    for future in as_completed(futures):
+        output[futures[future]] = future.result()
+
+# Imprimir en el orden original de proyectos
+for project in projects:
+    print("\n".join(output[project]))
 
 print("\n" + "=" * 80)
 print("💡 RECOMENDACIÓN:")
 print("   Usa el proyecto donde encontraste la tabla con más registros")
 print("   y actualiza PROJECT_CENTRAL en consolidated_tables_job.py")
-
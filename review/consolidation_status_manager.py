@@ -25,23 +25,37 @@ Permite actualizar y consultar el estado del proceso de consolidación.
 import sys
 import os
 from google.cloud import bigquery
+from google.cloud import bigquery_storage
 import pandas as pd
 from datetime import datetime
+import atexit
 import logging
+import time
 
 # Agregar el directorio actual al path para importar config
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import *
 
+# Vigencia (segundos) de los resultados de lectura cacheados en el manager
+CACHE_TTL_SECONDS = 30
+
+# Actualizaciones encoladas que disparan un flush() automático
+FLUSH_THRESHOLD = 500
+
 class ConsolidationStatusManager:
     """
     Gestor de estados de consolidación
     """
     
+    # Tablas ya verificadas en este proceso: {tabla: cantidad de campos}
+    _verified_tables = {}
+    
     def __init__(self):
         self.logger = self.setup_logging()
         self.client = bigquery.Client(project=PROJECT_SOURCE)
+        # Cliente de Storage Read API (se crea al leer resultados por primera vez)
+        self._bqstorage_client = None
         self.companies_table = f"{PROJECT_SOURCE}.{DATASET_NAME}.{TABLE_NAME}"
         
         # Estados de consolidación
@@ -51,17 +65,50 @@ class ConsolidationStatusManager:
             'ERROR': 2           # Error en el proceso
         }
         
+        # Actualizaciones de estado encoladas pendientes de enviar: {company_id: status}
+        self._pending = {}
+        # Lo encolado y no enviado se aplica igual al terminar el proceso
+        atexit.register(self.flush)
+        
+        # Cachés de lectura (timestamp, valor); se invalidan en cada escritura
+        self._summary_cache = None
+        self._companies_cache = None
+        
         self.logger.info("📊 ConsolidationStatusManager iniciado")
-        self.logger.info(f"📋 Tabla companies: {self.companies_table}")
+        self.logger.info("📋 Tabla companies: %s", self.companies_table)
         
-        # Verificar que la tabla existe
+        # Verificar que la tabla existe (una sola vez por proceso)
         try:
-            table = self.client.get_table(self.companies_table)
-            self.logger.info(f"✅ Tabla companies encontrada: {len(table.schema)} campos")
+            field_count = self._verify_table(self.companies_table)
+            self.logger.info("✅ Tabla companies encontrada: %s campos", field_count)
         except Exception as e:
-            self.logger.error(f"❌ Tabla companies NO encontrada: {str(e)}")
+            self.logger.error("❌ Tabla companies NO encontrada: %s", e)
             raise
     
+    def _verify_table(self, table_id):
+        """
+        Verifica que la tabla existe y retorna su cantidad de campos
+        
+        El resultado se memoiza a nivel de clase para que construir varios managers
+        no repita el get_table.
+        """
+        cls = type(self)
+        if table_id not in cls._verified_tables:
+            table = self.client.get_table(table_id)
+            cls._verified_tables[table_id] = len(table.schema)
+        return cls._verified_tables[table_id]
+    
+    def _get_bqstorage_client(self):
+        """
+        Retorna el cliente de Storage Read API (resultados en Arrow directo a pandas)
+        
+        Se crea en la primera lectura: los comandos que solo escriben no abren
+        el canal gRPC.
+        """
+        if self._bqstorage_client is None:
+            self._bqstorage_client = bigquery_storage.BigQueryReadClient()
+        return self._bqstorage_client
+    
     def setup_logging(self):
         """Configura el sistema de logging"""
         logging.basicConfig(
@@ -71,36 +118,127 @@ class ConsolidationStatusManager:
         )
         return logging.getLogger(__name__)
     
+    def _get_cached(self, cache):
+        """Retorna el valor de una caché (timestamp, valor) si sigue vigente"""
+        if cache is not None and time.monotonic() - cache[0] < CACHE_TTL_SECONDS:
+            return cache[1]
+        return None
+    
+    def _invalidate_caches(self):
+        """Descarta los resultados de lectura cacheados tras una escritura"""
+        self._summary_cache = None
+        self._companies_cache = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+    
+    def _log_company_error(self, company_id, status, error_message):
+        # Si hay error, podríamos agregar un campo adicional para el mensaje
+        if error_message and status == self.STATUS['ERROR']:
+            # Por ahora, solo logueamos el error
+            self.logger.error("Error en compañía %s: %s", company_id, error_message)
+    
     def update_company_status(self, company_id, status, error_message=None):
         """
-        Actualiza el estado de consolidación de una compañía
+        Actualiza el estado de consolidación de una compañía (escritura inmediata)
         
         Args:
             company_id (int): ID de la compañía
             status (int): Nuevo estado (0, 1, o 2)
             error_message (str, optional): Mensaje de error si status = 2
+            
+        Returns:
+            bool: True si la actualización fue exitosa
+        """
+        self._log_company_error(company_id, status, error_message)
+        
+        # Un estado encolado antes para esta compañía quedaría obsoleto
+        self._pending.pop(company_id, None)
+        return self.bulk_set_status([(company_id, status)])
+    
+    def queue_company_status(self, company_id, status, error_message=None):
         """
+        Encola el nuevo estado de una compañía para enviarlo en un único MERGE
+        
+        Se envía con flush(), al salir del bloque `with`, al terminar el proceso
+        o al acumular FLUSH_THRESHOLD actualizaciones. Si una compañía se encola
+        varias veces, se aplica solo su último estado.
+        
+        Args:
+            company_id (int): ID de la compañía
+            status (int): Nuevo estado (0, 1, o 2)
+            error_message (str, optional): Mensaje de error si status = 2
+            
+        Returns:
+            bool: False si un flush automático falló
+        """
+        self._log_company_error(company_id, status, error_message)
+        
+        self._pending[company_id] = status
+        if len(self._pending) >= FLUSH_THRESHOLD:
+            return self.flush()
+        return True
+    
+    def flush(self):
+        """
+        Envía todas las actualizaciones de estado encoladas en un único MERGE
+        
+        Returns:
+            bool: True si las actualizaciones se aplicaron
+        """
+        if not self._pending:
+            return True
+        
+        if not self.bulk_set_status(list(self._pending.items())):
+            return False
+        
+        self._pending.clear()
+        return True
+    
+    def bulk_set_status(self, pairs):
+        """
+        Actualiza el estado de varias compañías (cada una con su estado) en un solo job
+        
+        Args:
+            pairs (list): Lista de tuplas (company_id, status)
+            
+        Returns:
+            bool: True si la actualización fue exitosa
+        """
+        if not pairs:
+            return True
+        
         try:
-            update_query = f"""
-                UPDATE `{self.companies_table}`
-                SET 
-                    company_consolidated_status = {status},
+            merge_query = f"""
+                MERGE `{self.companies_table}` t
+                USING (SELECT company_id, status FROM UNNEST(@pairs)) p
+                ON t.company_id = p.company_id
+                WHEN MATCHED THEN UPDATE SET
+                    company_consolidated_status = p.status,
                     updated_at = CURRENT_TIMESTAMP()
-                WHERE company_id = {company_id}
             """
-            
-            # Si hay error, podríamos agregar un campo adicional para el mensaje
-            if error_message and status == self.STATUS['ERROR']:
-                # Por ahora, solo logueamos el error
-                self.logger.error(f"Error en compañía {company_id}: {error_message}")
-            
-            result = self.client.query(update_query).result()
-            self.logger.info(f"✅ Estado actualizado para compañía {company_id}: {status}")
-            
+            job_config = bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ArrayQueryParameter("pairs", "STRUCT", [
+                    bigquery.StructQueryParameter(
+                        None,
+                        bigquery.ScalarQueryParameter("company_id", "INT64", company_id),
+                        bigquery.ScalarQueryParameter("status", "INT64", status)
+                    )
+                    for company_id, status in pairs
+                ])
+            ])
+            
+            self.client.query(merge_query, job_config=job_config).result()
+            self.logger.info("✅ Estado actualizado para %s compañías", len(pairs))
+            self._invalidate_caches()
             return True
             
         except Exception as e:
-            self.logger.error(f"❌ Error actualizando estado de compañía {company_id}: {str(e)}")
+            self.logger.error("❌ Error actualizando estados de %s compañías: %s", len(pairs), e)
             return False
     
     def update_multiple_companies_status(self, company_ids, status, error_message=None):
@@ -117,73 +255,130 @@ class ConsolidationStatusManager:
                 self.logger.warning("⚠️  Lista de compañías vacía")
                 return True
             
-            # Crear lista de IDs para la consulta
-            ids_str = ', '.join(map(str, company_ids))
-            
             update_query = f"""
                 UPDATE `{self.companies_table}`
                 SET 
-                    company_consolidated_status = {status},
+                    company_consolidated_status = @status,
                     updated_at = CURRENT_TIMESTAMP()
-                WHERE company_id IN ({ids_str})
+                WHERE company_id IN UNNEST(@ids)
             """
+            job_config = bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ArrayQueryParameter("ids", "INT64", list(company_ids)),
+                bigquery.ScalarQueryParameter("status", "INT64", status)
+            ])
             
             # Debug: Mostrar la consulta
-            self.logger.info(f"🔍 Consulta UPDATE: {update_query}")
+            self.logger.info("🔍 Consulta UPDATE: %s", update_query)
             
-            result = self.client.query(update_query).result()
-            self.logger.info(f"✅ Estado actualizado para {len(company_ids)} compañías: {status}")
+            result = self.client.query(update_query, job_config=job_config).result()
+            self.logger.info("✅ Estado actualizado para %s compañías: %s", len(company_ids), status)
+            self._invalidate_caches()
             
             return True
             
         except Exception as e:
-            self.logger.error(f"❌ Error actualizando estados múltiples: {str(e)}")
-            self.logger.error(f"🔍 Consulta que falló: {update_query}")
+            self.logger.error("❌ Error actualizando estados múltiples: %s", e)
+            self.logger.error("🔍 Consulta que falló: %s", update_query)
             return False
     
-    def get_companies_by_status(self, status):
+    def get_companies_by_status(self, status, count_only=False):
         """
         Obtiene compañías por estado de consolidación
         
+        Las compañías de todos los estados se obtienen en un solo job y se cachean
+        (CACHE_TTL_SECONDS), de modo que consultas sucesivas por distintos estados
+        no vuelven a escanear la tabla.
+        
         Args:
             status (int): Estado a filtrar
+            count_only (bool): Si True, retorna solo el conteo (desde el resumen cacheado)
             
         Returns:
-            pd.DataFrame: DataFrame con las compañías
+            pd.DataFrame: DataFrame con las compañías (int si count_only)
         """
+        status_name = {v: k for k, v in self.STATUS.items()}[status]
+        
+        if count_only:
+            return self.get_consolidation_summary().get(status_name, 0)
+        
+        self.flush()
+        
         try:
-            query = f"""
-                SELECT 
-                    company_id,
-                    company_name,
-                    company_project_id,
-                    company_consolidated_status,
-                    updated_at
-                FROM `{self.companies_table}`
-                WHERE company_consolidated_status = {status}
-                ORDER BY company_id
-            """
-            
-            self.logger.info(f"🔄 Ejecutando consulta: {query}")
-            self.logger.info(f"📊 Tabla: {self.companies_table}")
-            query_job = self.client.query(query)
-            self.logger.info(f"📋 Job creado: {query_job.job_id}")
-            
-            result = query_job.result()
-            self.logger.info(f"✅ Consulta completada, procesando resultados...")
+            all_companies_df = self._get_cached(self._companies_cache)
+            
+            if all_companies_df is None:
+                query = f"""
+                    SELECT 
+                        company_id,
+                        company_name,
+                        company_project_id,
+                        company_consolidated_status,
+                        updated_at
+                    FROM `{self.companies_table}`
+                    WHERE company_consolidated_status IN UNNEST(@statuses)
+                    ORDER BY company_id
+                """
+                job_config = bigquery.QueryJobConfig(query_parameters=[
+                    bigquery.ArrayQueryParameter("statuses", "INT64", list(self.STATUS.values()))
+                ])
+                
+                self.logger.info("🔄 Obteniendo compañías por estado (status=%s)", status)
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("Query: %s", query)
+                self.logger.info("📊 Tabla: %s", self.companies_table)
+                query_job = self.client.query(query, job_config=job_config)
+                self.logger.info("📋 Job creado: %s", query_job.job_id)
+                
+                result = query_job.result()
+                self.logger.info("✅ Consulta completada, procesando resultados...")
+                
+                all_companies_df = result.to_dataframe(bqstorage_client=self._get_bqstorage_client(), create_bqstorage_client=False)
+                self.logger.info("📊 DataFrame creado con %s filas", len(all_companies_df))
+                self._companies_cache = (time.monotonic(), all_companies_df)
             
-            companies_df = pd.DataFrame([dict(row) for row in result])
-            self.logger.info(f"📊 DataFrame creado con {len(companies_df)} filas")
+            companies_df = all_companies_df[
+                all_companies_df['company_consolidated_status'] == status
+            ].reset_index(drop=True)
             
-            status_name = {v: k for k, v in self.STATUS.items()}[status]
-            self.logger.info(f"📋 Compañías con estado {status_name} ({status}): {len(companies_df)}")
+            self.logger.info("📋 Compañías con estado %s (%s): %s", status_name, status, len(companies_df))
             
             return companies_df
             
         except Exception as e:
-            self.logger.error(f"❌ Error obteniendo compañías por estado: {str(e)}")
+            self.logger.error("❌ Error obteniendo compañías por estado: %s", e)
             return pd.DataFrame()
     
+    def iter_companies_by_status(self, status, page_size=2000):
+        """
+        Itera compañías por estado sin construir un DataFrame
+        
+        Las filas se descargan por páginas a medida que se consumen; útil cuando
+        solo se van a imprimir.
+        
+        Args:
+            status (int): Estado a filtrar
+            page_size (int): Filas por página descargada
+            
+        Returns:
+            RowIterator: Iterador de bigquery.Row (total_rows indica el total)
+        """
+        self.flush()
+        
+        query = f"""
+            SELECT 
+                company_id,
+                company_name,
+                company_project_id
+            FROM `{self.companies_table}`
+            WHERE company_consolidated_status = @status
+            ORDER BY company_id
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("status", "INT64", status)
+        ])
+        
+        return self.client.query(query, job_config=job_config).result(page_size=page_size)
+    
     def get_consolidation_summary(self):
         """
         Obtiene resumen del estado de consolidación
@@ -191,6 +386,12 @@ class ConsolidationStatusManager:
         Returns:
             dict: Resumen con conteos por estado
         """
+        self.flush()
+        
+        cached_summary = self._get_cached(self._summary_cache)
+        if cached_summary is not None:
+            return dict(cached_summary)
+        
         try:
             query = f"""
                 SELECT 
@@ -222,10 +423,11 @@ class ConsolidationStatusManager:
                 elif status == self.STATUS['ERROR']:
                     summary['ERROR'] = count
             
-            return summary
+            self._summary_cache = (time.monotonic(), summary)
+            return dict(summary)
             
         except Exception as e:
-            self.logger.error(f"❌ Error obteniendo resumen: {str(e)}")
+            self.logger.error("❌ Error obteniendo resumen: %s", e)
             return {}
     
     def print_consolidation_summary(self):
@@ -264,20 +466,28 @@ class ConsolidationStatusManager:
             print("⚠️  Esta acción reseteará TODOS los estados a 'PENDING'")
             print("✅ Continuando automáticamente en modo job...")
         
+        # Las actualizaciones pendientes quedan sin efecto tras el reset
+        self._pending.clear()
+        
         try:
             query = f"""
                 UPDATE `{self.companies_table}`
                 SET 
-                    company_consolidated_status = {self.STATUS['PENDING']},
+                    company_consolidated_status = @status,
                     updated_at = CURRENT_TIMESTAMP()
+                WHERE TRUE
             """
+            job_config = bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ScalarQueryParameter("status", "INT64", self.STATUS['PENDING'])
+            ])
             
-            result = self.client.query(query).result()
+            result = self.client.query(query, job_config=job_config).result()
             self.logger.info("✅ Todos los estados reseteados a PENDING")
+            self._invalidate_caches()
             return True
             
         except Exception as e:
-            self.logger.error(f"❌ Error reseteando estados: {str(e)}")
+            self.logger.error("❌ Error reseteando estados: %s", e)
             return False
     
     def get_companies_for_consolidation(self, limit=None):
@@ -290,8 +500,16 @@ class ConsolidationStatusManager:
         Returns:
             pd.DataFrame: Compañías pendientes
         """
+        self.flush()
+        
         try:
-            limit_clause = f"LIMIT {limit}" if limit else ""
+            query_parameters = [
+                bigquery.ScalarQueryParameter("status", "INT64", self.STATUS['PENDING'])
+            ]
+            limit_clause = ""
+            if limit:
+                limit_clause = "LIMIT @limit"
+                query_parameters.append(bigquery.ScalarQueryParameter("limit", "INT64", limit))
             
             query = f"""
                 SELECT 
@@ -299,21 +517,24 @@ class ConsolidationStatusManager:
                     company_name,
                     company_project_id
                 FROM `{self.companies_table}`
-                WHERE company_consolidated_status = {self.STATUS['PENDING']}
+                WHERE company_consolidated_status = @status
                 ORDER BY company_id
                 {limit_clause}
             """
+            job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
             
-            self.logger.info(f"🔄 Ejecutando consulta: {query}")
-            query_job = self.client.query(query)
+            self.logger.info("🔄 Obteniendo compañías pendientes (status=%s)", self.STATUS['PENDING'])
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Query: %s", query)
+            query_job = self.client.query(query, job_config=job_config)
             result = query_job.result()
-            companies_df = pd.DataFrame([dict(row) for row in result])
+            companies_df = result.to_dataframe(bqstorage_client=self._get_bqstorage_client(), create_bqstorage_client=False)
             
-            self.logger.info(f"📋 Compañías pendientes obtenidas: {len(companies_df)}")
+            self.logger.info("📋 Compañías pendientes obtenidas: %s", len(companies_df))
             return companies_df
             
         except Exception as e:
-            self.logger.error(f"❌ Error obteniendo compañías pendientes: {str(e)}")
+            self.logger.error("❌ Error obteniendo compañías pendientes: %s", e)
             return pd.DataFrame()
 
 def main():
@@ -341,22 +562,22 @@ def main():
             manager.print_consolidation_summary()
             
         elif command == "pending":
-            companies = manager.get_companies_by_status(manager.STATUS['PENDING'])
-            print(f"\n📋 COMPAÑÍAS PENDIENTES ({len(companies)}):")
-            for _, company in companies.iterrows():
-                print(f"  - {company['company_id']}: {company['company_name']} ({company['company_project_id']})")
+            companies = manager.iter_companies_by_status(manager.STATUS['PENDING'])
+            print(f"\n📋 COMPAÑÍAS PENDIENTES ({companies.total_rows}):")
+            for company in companies:
+                print(f"  - {company.company_id}: {company.company_name} ({company.company_project_id})")
             
         elif command == "completed":
-            companies = manager.get_companies_by_status(manager.STATUS['COMPLETED'])
-            print(f"\n✅ COMPAÑÍAS COMPLETADAS ({len(companies)}):")
-            for _, company in companies.iterrows():
-                print(f"  - {company['company_id']}: {company['company_name']} ({company['company_project_id']})")
+            companies = manager.iter_companies_by_status(manager.STATUS['COMPLETED'])
+            print(f"\n✅ COMPAÑÍAS COMPLETADAS ({companies.total_rows}):")
+            for company in companies:
+                print(f"  - {company.company_id}: {company.company_name} ({company.company_project_id})")
             
         elif command == "errors":
-            companies = manager.get_companies_by_status(manager.STATUS['ERROR'])
-            print(f"\n❌ COMPAÑÍAS CON ERRORES ({len(companies)}):")
-            for _, company in companies.iterrows():
-                print(f"  - {company['company_id']}: {company['company_name']} ({company['company_project_id']})")
+            companies = manager.iter_companies_by_status(manager.STATUS['ERROR'])
+            print(f"\n❌ COMPAÑÍAS CON ERRORES ({companies.total_rows}):")
+            for company in companies:
+                print(f"  - {company.company_id}: {company.company_name} ({company.company_project_id})")
             
         elif command == "update":
             if len(sys.argv) < 4:
@@ -2,14 +2,21 @@
 Script para investigar el error específico con estimate_external_link
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import bigquery
-import pandas as pd
+from _bq import get_client
 from config import PROJECT_SOURCE, DATASET_NAME
 
+# Región de los datasets de las compañías (INFORMATION_SCHEMA a nivel de región)
+INFORMATION_SCHEMA_REGION = "region-us"
+
+# Consultas concurrentes contra BigQuery
+MAX_WORKERS = 16
+
 def debug_estimate_error():
     """Investiga el error específico con estimate_external_link"""
     
-    client = bigquery.Client(project=PROJECT_SOURCE)
+    client = get_client()
     
     print("🔍 INVESTIGACIÓN: Error específico con estimate_external_link")
     print("=" * 60)
@@ -24,41 +31,71 @@ def debug_estimate_error():
     ORDER BY company_id
     """
     
-    companies_df = client.query(companies_query).to_dataframe()
+    companies_df = client.query(companies_query).to_dataframe(create_bqstorage_client=True)
     
     print(f"📋 Compañías a verificar: {len(companies_df)}")
     
-    # 2. Verificar cada compañía que tiene estimate_external_link
-    companies_with_estimate = []
+    # Dataset bronze de cada compañía (operación vectorizada, no por fila)
+    companies_df['dataset_name'] = 'servicetitan_' + companies_df['company_project_id'].str.replace('-', '_', regex=False)
     
-    for _, company in companies_df.iterrows():
-        project_id = company['company_project_id']
-        company_name = company['company_name']
-        company_id = company['company_id']
+    # 2. Obtener los campos de estimate_external_link con una sola consulta por proyecto
+    #    (la existencia de la tabla se deduce de que tenga columnas)
+    def probe(project_id, datasets):
+        fields_query = f"""
+        SELECT 
+          table_schema,
+          column_name,
+          data_type,
+          is_nullable
+        FROM `{project_id}.{INFORMATION_SCHEMA_REGION}.INFORMATION_SCHEMA.COLUMNS`
+        WHERE table_name = @table_name
+          AND table_schema IN UNNEST(@datasets)
+        ORDER BY table_schema, ordinal_position
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("table_name", "STRING", 'estimate_external_link'),
+            bigquery.ArrayQueryParameter("datasets", "STRING", datasets)
+        ])
         
+        project_fields_df = client.query(fields_query, job_config=job_config).to_dataframe(create_bqstorage_client=True)
+        # Dtype Arrow: los filtros .str (p. ej. startswith('_fivetran')) usan kernels de Arrow
+        project_fields_df['column_name'] = project_fields_df['column_name'].astype('string[pyarrow]')
+        return project_fields_df
+    
+    project_groups = list(companies_df.groupby('company_project_id', sort=False))
+    
+    # Las consultas son I/O contra BigQuery: se ejecutan en paralelo
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(probe, project_id, project_companies['dataset_name'].unique().tolist())
+            for project_id, project_companies in project_groups
+        ]
+    
+    companies_with_estimate = []
+    
+    for (project_id, project_companies), future in zip(project_groups, futures):
         try:
-            dataset_name = f"servicetitan_{project_id.replace('-, '_')}"
-            
-            # Verificar si existe la tabla
-            check_query = f"""
-            SELECT table_name
-            FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.TABLES`
-            WHERE table_name = 'estimate_external_link'
-            """
-            
-            result = client.query(check_query).to_dataframe()
-            
-            if not result.empty:
-                companies_with_estimate.append({
-                    'company_id': company_id,
-                    'company_name': company_name,
-                    'project_id': project_id,
-                    'dataset_name': dataset_name
-                })
-                print(f"  ✅ {company_name} ({company_id}): Tabla existe en {dataset_name}")
-                
+            project_fields_df = future.result()
         except Exception as e:
-            print(f"  ⚠️  {company_name} ({company_id}): Error verificando existencia - {str(e)}")
+            for company_id, company_name in project_companies[
+                    ['company_id', 'company_name']].itertuples(index=False, name=None):
+                print(f"  ⚠️  {company_name} ({company_id}): Error verificando existencia - {str(e)}")
+            continue
+        
+        for company_id, company_name, dataset_name in project_companies[
+                ['company_id', 'company_name', 'dataset_name']].itertuples(index=False, name=None):
+            fields_df = project_fields_df[project_fields_df['table_schema'] == dataset_name]
+            if fields_df.empty:
+                continue
+            
+            companies_with_estimate.append({
+                'company_id': company_id,
+                'company_name': company_name,
+                'project_id': project_id,
+                'dataset_name': dataset_name,
+                'fields_df': fields_df
+            })
+            print(f"  ✅ {company_name} ({company_id}): Tabla existe en {dataset_name}")
     
     print(f"\n📊 Compañías con estimate_external_link: {len(companies_with_estimate)}")
     
@@ -69,18 +106,8 @@ def debug_estimate_error():
         print(f"\n--- Analizando {comp['company_name']} ({comp['company_id']}) ---")
         
         try:
-            # Obtener campos de la tabla (como lo hace el script)
-            fields_query = f"""
-            SELECT 
-              column_name,
-              data_type,
-              is_nullable
-            FROM `{comp['project_id']}.{comp['dataset_name']}.INFORMATION_SCHEMA.COLUMNS`
-            WHERE table_name = 'estimate_external_link'
-            ORDER BY ordinal_position
-            """
-            
-            fields_df = client.query(fields_query).to_dataframe()
+            # Campos de la tabla (ya obtenidos en el paso 2)
+            fields_df = comp['fields_df']
             
             if fields_df.empty:
                 print(f"  ❌ No se pudieron obtener campos de la tabla")
@@ -95,37 +122,31 @@ def debug_estimate_error():
             # Mostrar algunos campos como ejemplo
             if len(filtered_fields) > 0:
                 print(f"  📋 Primeros 5 campos:")
-                for _, field in filtered_fields.head().iterrows():
-                    print(f"     - {field['column_name']} ({field['data_type']})")
+                for column_name, data_type in filtered_fields[
+                        ['column_name', 'data_type']].head().itertuples(index=False, name=None):
+                    print(f"     - {column_name} ({data_type})")
             
             # Intentar generar SQL de vista (como lo hace el script)
             print(f"  🔄 Intentando generar SQL de vista...")
             
-            # Crear SQL básico
-            sql_fields = []
-            for _, field in filtered_fields.iterrows():
-                sql_fields.append(f"    {field['column_name']}")
+            # Crear SQL básico (concatenación vectorizada de la columna)
+            sql_fields_str = ',\n'.join('    ' + filtered_fields['column_name'])
             
             sql_content = f"""
 CREATE OR REPLACE VIEW `{comp['project_id']}.silver.vw_estimate_external_link` AS
 SELECT
-{',\n'.join(sql_fields)}
+{sql_fields_str}
 FROM `{comp['project_id']}.{comp['dataset_name']}.estimate_external_link`
 """
             
-            print(f"  ✅ SQL generado exitosamente ({len(sql_fields)} campos)")
+            print(f"  ✅ SQL generado exitosamente ({len(filtered_fields)} campos)")
             
-            # Intentar ejecutar la vista (solo para probar)
-            print(f"  🔄 Probando ejecución de vista...")
+            # Validar el SQL de la vista con dry-run (no crea la vista ni consume slots)
+            print(f"  🔄 Probando ejecución de vista (dry-run)...")
             try:
-                query_job = client.query(sql_content)
-                query_job.result()  # Esperar a que termine
-                print(f"  ✅ Vista creada exitosamente")
-                
-                # Limpiar la vista de prueba
-                cleanup_sql = f"DROP VIEW IF EXISTS `{comp['project_id']}.silver.vw_estimate_external_link`"
-                client.query(cleanup_sql).result()
-                print(f"  🧹 Vista de prueba eliminada")
+                dry_run_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+                client.query(sql_content, job_config=dry_run_config)
+                print(f"  ✅ SQL de vista válido")
                 
             except Exception as e:
                 print(f"  ❌ Error ejecutando vista: {str(e)}")
@@ -2,14 +2,22 @@
 Script para investigar por qué estimate_external_link no fue procesada
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import bigquery
 import pandas as pd
+from _bq import get_client
 from config import PROJECT_SOURCE, DATASET_NAME
 
+# Región de los datasets de las compañías (INFORMATION_SCHEMA a nivel de región)
+INFORMATION_SCHEMA_REGION = "region-us"
+
+# Consultas concurrentes contra BigQuery
+MAX_WORKERS = 16
+
 def debug_processing_issue():
     """Investiga por qué estimate_external_link no fue procesada"""
     
-    client = bigquery.Client(project=PROJECT_SOURCE)
+    client = get_client()
     
     print("🔍 INVESTIGACIÓN: ¿Por qué estimate_external_link no fue procesada?")
     print("=" * 70)
@@ -29,7 +37,7 @@ def debug_processing_issue():
     ORDER BY company_id
     """
     
-    df1 = client.query(query1).to_dataframe()
+    df1 = client.query(query1).to_dataframe(create_bqstorage_client=True)
     
     if df1.empty:
         print("❌ estimate_external_link NO está en companies_consolidated")
@@ -65,36 +73,57 @@ def debug_processing_issue():
         ORDER BY company_id
         """
         
-        companies_df = client.query(companies_query).to_dataframe()
+        companies_df = client.query(companies_query).to_dataframe(create_bqstorage_client=True)
+        
+        # Dataset bronze de cada compañía (operación vectorizada, no por fila)
+        companies_df['dataset_name'] = 'servicetitan_' + companies_df['company_project_id'].str.replace('-', '_', regex=False)
+        companies = companies_df.to_dict('records')
+        
+        # Una consulta por proyecto con todos sus datasets (en lugar de una por compañía)
+        datasets_by_project = {}
+        for company in companies:
+            datasets_by_project.setdefault(company['company_project_id'], []).append(company['dataset_name'])
+        
+        def probe(project_id, datasets):
+            check_query = f"""
+            SELECT table_schema
+            FROM `{project_id}.{INFORMATION_SCHEMA_REGION}.INFORMATION_SCHEMA.TABLES`
+            WHERE table_name = 'estimate_external_link'
+              AND table_schema IN UNNEST(@datasets)
+            """
+            job_config = bigquery.QueryJobConfig(query_parameters=[
+                bigquery.ArrayQueryParameter("datasets", "STRING", sorted(set(datasets)))
+            ])
+            
+            return {row.table_schema for row in client.query(check_query, job_config=job_config).result()}
+        
+        # Las consultas son I/O contra BigQuery: se ejecutan en paralelo
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {
+                project_id: executor.submit(probe, project_id, datasets)
+                for project_id, datasets in datasets_by_project.items()
+            }
         
         companies_with_table = []
         
-        for _, company in companies_df.iterrows():
-            project_id = company['company_project_id']
+        for company in companies:
             company_name = company['company_name']
+            dataset_name = company['dataset_name']
             
             try:
-                dataset_name = f"servicetitan_{project_id.replace('-', '_')}"
-                
-                check_query = f"""
-                SELECT table_name
-                FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.TABLES`
-                WHERE table_name = 'estimate_external_link'
-                """
-                
-                result = client.query(check_query).to_dataframe()
-                
-                if not result.empty:
-                    companies_with_table.append({
-                        'company_id': company['company_id'],
-                        'company_name': company_name,
-                        'project_id': project_id,
-                        'dataset_name': dataset_name
-                    })
-                    print(f"  ✅ {company_name} ({company['company_id']}): Tabla existe en {dataset_name}")
-                    
+                datasets_with_table = futures[company['company_project_id']].result()
             except Exception as e:
                 print(f"  ⚠️  {company_name} ({company['company_id']}): Error - {str(e)}")
+                continue
+            
+            if dataset_name in datasets_with_table:
+                companies_with_table.append({
+                    'company_id': company['company_id'],
+                    'company_name': company_name,
+                    'project_id': company['company_project_id'],
+                    'dataset_name': dataset_name
+                })
+                print(f"  ✅ {company_name} ({company['company_id']}): Tabla existe en {dataset_name}")
         
         print(f"\n📊 RESUMEN:")
         print(f"   - Compañías con estimate_external_link: {len(companies_with_table)}")
@@ -120,8 +149,9 @@ def debug_processing_issue():
         errors = df1[df1['consolidated_status'] == 2]
         if not errors.empty:
             print(f"\n❌ Errores encontrados:")
-            for _, error in errors.iterrows():
-                print(f"   - {error['company_id']}: {error['error_message']}")
+            for company_id, error_message in errors[
+                    ['company_id', 'error_message']].itertuples(index=False, name=None):
+                print(f"   - {company_id}: {error_message}")
         else:
             print(f"\n✅ No hay errores registrados")
 
@@ -2,26 +2,29 @@
 Script para verificar el orden de procesamiento y por qué estimate_external_link no fue procesada
 """
 
-from google.cloud import bigquery
 import pandas as pd
+from _bq import get_client
 from config import PROJECT_SOURCE, DATASET_NAME, TABLES_TO_PROCESS
 
 def debug_processing_order():
     """Investiga el orden de procesamiento"""
     
-    client = bigquery.Client(project=PROJECT_SOURCE)
+    client = get_client()
     
     print("🔍 INVESTIGACIÓN: Orden de procesamiento")
     print("=" * 50)
     
+    # Posición (1-based) de cada tabla, calculada una sola vez
+    positions = {table: i for i, table in enumerate(TABLES_TO_PROCESS, 1)}
+    
     # 1. Mostrar TABLES_TO_PROCESS en orden
     print(f"📋 TABLES_TO_PROCESS (orden de procesamiento):")
     for i, table in enumerate(TABLES_TO_PROCESS, 1):
         print(f"   {i:2d}. {table}")
     
     # 2. Verificar dónde está estimate_external_link
-    if 'estimate_external_link' in TABLES_TO_PROCESS:
-        position = TABLES_TO_PROCESS.index('estimate_external_link') + 1
+    if 'estimate_external_link' in positions:
+        position = positions['estimate_external_link']
         print(f"\n🎯 estimate_external_link está en posición {position} de {len(TABLES_TO_PROCESS)}")
         
         # 3. Verificar qué tablas fueron procesadas
@@ -34,11 +37,12 @@ def debug_processing_order():
         ORDER BY table_name
         """
         
-        processed_df = client.query(processed_query).to_dataframe()
+        processed_df = client.query(processed_query).to_dataframe(create_bqstorage_client=True)
         
         print(f"📊 Tablas procesadas ({len(processed_df)}):")
-        for _, row in processed_df.iterrows():
-            print(f"   ✅ {row['table_name']} ({row['company_count']} compañías)")
+        for table_name, company_count in processed_df[
+                ['table_name', 'company_count']].itertuples(index=False, name=None):
+            print(f"   ✅ {table_name} ({company_count} compañías)")
         
         # 4. Encontrar la última tabla procesada
         if not processed_df.empty:
@@ -46,19 +50,17 @@ def debug_processing_order():
             print(f"\n🔚 Última tabla procesada: {last_processed}")
             
             # Verificar si estimate_external_link viene después
-            try:
-                last_position = TABLES_TO_PROCESS.index(last_processed) + 1
-                estimate_position = TABLES_TO_PROCESS.index('estimate_external_link') + 1
-                
-                if estimate_position > last_position:
-                    print(f"🎯 estimate_external_link (posición {estimate_position}) viene DESPUÉS de {last_processed} (posición {last_position})")
-                    print(f"   ✅ CONFIRMADO: El script se cayó antes de procesar estimate_external_link")
-                else:
-                    print(f"⚠️  estimate_external_link (posición {estimate_position}) viene ANTES de {last_processed} (posición {last_position})")
-                    print(f"   ❌ PROBLEMA: Debería haber sido procesada")
-                    
-            except ValueError as e:
-                print(f"⚠️  Error verificando posiciones: {str(e)}")
+            last_position = positions.get(last_processed)
+            estimate_position = positions['estimate_external_link']
+            
+            if last_position is None:
+                print(f"⚠️  Error verificando posiciones: {last_processed} no está en TABLES_TO_PROCESS")
+            elif estimate_position > last_position:
+                print(f"🎯 estimate_external_link (posición {estimate_position}) viene DESPUÉS de {last_processed} (posición {last_position})")
+                print(f"   ✅ CONFIRMADO: El script se cayó antes de procesar estimate_external_link")
+            else:
+                print(f"⚠️  estimate_external_link (posición {estimate_position}) viene ANTES de {last_processed} (posición {last_position})")
+                print(f"   ❌ PROBLEMA: Debería haber sido procesada")
         
         # 5. Verificar si hay errores en el procesamiento de estimate_external_link
         print(f"\n🔍 Verificando si hay errores específicos...")
@@ -77,7 +79,7 @@ def debug_processing_order():
         ORDER BY company_id
         """
         
-        error_df = client.query(error_query).to_dataframe()
+        error_df = client.query(error_query).to_dataframe(create_bqstorage_client=True)
         
         if error_df.empty:
             print("❌ No hay registros de estimate_external_link en companies_consolidated")
@@ -2,14 +2,75 @@
 Script para investigar el status de la tabla estimate_external_link
 """
 
-from google.cloud import bigquery
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
+from _bq import get_client, metadata_job_config
+from _companies_cache import load_companies
 from config import PROJECT_SOURCE, DATASET_NAME
 
+# Verificaciones concurrentes contra BigQuery
+MAX_WORKERS = int(os.getenv("BQ_METADATA_PARALLELISM", 20))
+
+# Espera máxima por verificación: un proyecto atascado se reporta como error
+CHECK_TIMEOUT_SEC = 20
+
+def _check_company(client, company):
+    """Verifica si estimate_external_link existe en el dataset de una compañía"""
+    project_id = company.company_project_id
+    dataset_name = company.dataset_name
+    
+    try:
+        # Verificar si la tabla existe en el dataset servicetitan
+        check_query = f"""
+        SELECT table_name
+        FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.TABLES`
+        WHERE table_name = 'estimate_external_link'
+        """
+        
+        result = client.query(check_query, job_config=metadata_job_config()).result(timeout=CHECK_TIMEOUT_SEC).to_dataframe()
+        return company.company_name, project_id, dataset_name, not result.empty, None
+    except Exception as e:
+        return company.company_name, project_id, dataset_name, False, str(e)
+
+def _check_all_companies(client, companies_df):
+    """Verifica todas las compañías en un único job UNION ALL.
+    
+    Si el lote falla (p.ej. un dataset inexistente), se cae a una
+    verificación por compañía para aislar los proyectos con error.
+    """
+    companies = list(companies_df.itertuples(index=False))
+    if not companies:
+        return []
+    
+    union_query = "\nUNION ALL\n".join(
+        f"""
+        SELECT {company.company_id} AS company_id, COUNT(*) AS c
+        FROM `{company.company_project_id}.{company.dataset_name}.INFORMATION_SCHEMA.TABLES`
+        WHERE table_name = 'estimate_external_link'
+        """
+        for company in companies
+    )
+    
+    try:
+        counts = {row.company_id: row.c for row in client.query(union_query, job_config=metadata_job_config()).result()}
+    except Exception as e:
+        print(f"  ⚠️  Verificación en lote falló, verificando por compañía: {str(e)}")
+        # Las verificaciones son I/O contra BigQuery: se ejecutan en paralelo
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = [executor.submit(_check_company, client, company) for company in companies]
+            return [future.result() for future in as_completed(futures)]
+    
+    return [
+        (company.company_name, company.company_project_id, company.dataset_name,
+         counts.get(company.company_id, 0) > 0, None)
+        for company in companies
+    ]
+
 def debug_table_status():
     """Investiga el status de estimate_external_link"""
     
-    client = bigquery.Client(project=PROJECT_SOURCE)
+    client = get_client()
     
     print("🔍 INVESTIGACIÓN: estimate_external_link")
     print("=" * 60)
@@ -42,45 +103,19 @@ def debug_table_status():
     # 2. Verificar si existe en algún proyecto de compañía
     print(f"\n🔍 Verificando existencia en proyectos de compañías...")
     
-    # Obtener compañías
-    companies_query = f"""
-    SELECT company_id, company_name, company_project_id
-    FROM `{PROJECT_SOURCE}.{DATASET_NAME}.companies`
-    WHERE company_fivetran_status = TRUE 
-      AND company_bigquery_status = TRUE
-      AND company_project_id IS NOT NULL
-    ORDER BY company_id
-    """
-    
-    companies_df = client.query(companies_query).to_dataframe()
+    # Obtener compañías (cache local con TTL)
+    companies_df = load_companies()
     
     table_exists_count = 0
     
-    for _, company in companies_df.iterrows():
-        project_id = company['company_project_id']
-        company_name = company['company_name']
-        
-        try:
-            # Construir nombre del dataset: servicetitan_<project_id> con guiones
-            dataset_name = f"servicetitan_{project_id.replace('-', '_')}"
-            
-            # Verificar si la tabla existe en el dataset servicetitan
-            check_query = f"""
-            SELECT table_name
-            FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.TABLES`
-            WHERE table_name = 'estimate_external_link'
-            """
-            
-            result = client.query(check_query).to_dataframe()
-            
-            if not result.empty:
-                print(f"  ✅ {company_name} ({project_id}): Tabla existe en {dataset_name}")
-                table_exists_count += 1
-            else:
-                print(f"  ❌ {company_name} ({project_id}): Tabla NO existe en {dataset_name}")
-                
-        except Exception as e:
-            print(f"  ⚠️  {company_name} ({project_id}): Error verificando - {str(e)}")
+    for company_name, project_id, dataset_name, exists, error in _check_all_companies(client, companies_df):
+        if error is not None:
+            print(f"  ⚠️  {company_name} ({project_id}): Error verificando - {error}")
+        elif exists:
+            print(f"  ✅ {company_name} ({project_id}): Tabla existe en {dataset_name}")
+            table_exists_count += 1
+        else:
+            print(f"  ❌ {company_name} ({project_id}): Tabla NO existe en {dataset_name}")
     
     print(f"\n📊 RESUMEN:")
     print(f"   - Tablas encontradas: {table_exists_count}/{len(companies_df)} compañías")
@@ -8,17 +8,29 @@ Permite ejecutar, monitorear y revertir operaciones de manera segura.
 
 import sys
 import os
-import json
+import shlex
+import atexit
 import logging
+import threading
 from datetime import datetime
 from pathlib import Path
 import subprocess
-from google.cloud import bigquery
+from collections import deque
+from itertools import takewhile
+from operator import itemgetter
 
 # Agregar el directorio actual al path para importar config
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import *
+from _bq import get_client
+from _jsonio import dump_json_line, loads_json, write_json
+
+# Líneas finales de la salida de un comando que se guardan en el log de operaciones
+OUTPUT_TAIL_LINES = 500
+
+# Sesión del proceso padre: los scripts lanzados por execute_safe registran en ella sus operaciones
+SESSION_ENV_VAR = "CCPD_EXECUTION_SESSION"
 
 class ExecutionManager:
     """
@@ -26,10 +38,14 @@ class ExecutionManager:
     """
     
     def __init__(self, session_name=None):
-        self.session_name = session_name or f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # Un script lanzado por execute_safe se une a la sesión del padre en lugar de abrir otra
+        parent_session = os.environ.get(SESSION_ENV_VAR)
+        self.is_child = session_name is None and bool(parent_session)
+        self.session_name = session_name or parent_session or f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         self.session_dir = f"execution_sessions/{self.session_name}"
         self.log_file = f"{self.session_dir}/execution.log"
         self.operations_log = f"{self.session_dir}/operations.json"
+        self.operations_stream = f"{self.session_dir}/operations.jsonl"
         self.rollback_script = f"{self.session_dir}/rollback.sql"
         
         # Crear directorio de sesión
@@ -38,21 +54,29 @@ class ExecutionManager:
         # Configurar logging
         self.setup_logging()
         
-        # Inicializar log de operaciones
+        # Inicializar log de operaciones (un único handle abierto durante la sesión)
         self.operations = []
+        self._counts = {'SUCCESS': 0, 'FAILED': 0, 'EXCEPTION': 0, 'STARTED': 0}
+        self._ops_lock = threading.Lock()
+        self._ops_fh = open(self.operations_stream, 'ab', buffering=1 << 16)
+        atexit.register(self._ops_fh.close)
         
-        self.logger.info(f"🚀 ExecutionManager iniciado - Sesión: {self.session_name}")
+        if self.is_child:
+            self.logger.info(f"🔗 ExecutionManager unido a la sesión padre: {self.session_name}")
+        else:
+            self.logger.info(f"🚀 ExecutionManager iniciado - Sesión: {self.session_name}")
         self.logger.info(f"📁 Directorio de sesión: {self.session_dir}")
     
     def setup_logging(self):
         """Configura el sistema de logging"""
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if not self.is_child:
+            # En un proceso hijo el padre ya escribe su stdout en execution.log
+            handlers.insert(0, logging.FileHandler(self.log_file, encoding='utf-8'))
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.log_file, encoding='utf-8'),
-                logging.StreamHandler(sys.stdout)
-            ]
+            handlers=handlers
         )
         self.logger = logging.getLogger(__name__)
     
@@ -65,18 +89,29 @@ class ExecutionManager:
             'status': status,
             'session': self.session_name
         }
-        self.operations.append(operation)
+        line = dump_json_line(operation)
         
-        # Guardar en archivo
-        with open(self.operations_log, 'w', encoding='utf-8') as f:
-            json.dump(self.operations, f, indent=2, ensure_ascii=False)
+        # Append de una línea por operación (operations.json se escribe al cerrar la sesión).
+        # Los SUCCESS (p.ej. vistas creadas) se vuelcan a disco de inmediato: el
+        # rollback debe verlos aunque el proceso muera antes de cerrar la sesión
+        with self._ops_lock:
+            self.operations.append(operation)
+            self._counts[status] = self._counts.get(status, 0) + 1
+            self._ops_fh.write(line)
+            if status == "SUCCESS":
+                self._ops_fh.flush()
         
         self.logger.info(f"📝 Operación registrada: {operation_type} - {status}")
     
     def execute_safe(self, command, description, rollback_command=None):
         """
         Ejecuta un comando de manera segura con logging y rollback
+        
+        `command` es una lista argv (o un string que se separa con shlex); se
+        ejecuta sin shell intermedio.
         """
+        args = command if isinstance(command, list) else shlex.split(command)
+        
         self.log_operation("EXECUTION", {
             "command": command,
             "description": description,
@@ -85,32 +120,51 @@ class ExecutionManager:
         
         try:
             self.logger.info(f"🔄 Ejecutando: {description}")
-            self.logger.info(f"📋 Comando: {command}")
+            self.logger.info(f"📋 Comando: {shlex.join(args)}")
+            
+            # Ejecutar comando: la salida se reenvía al logger línea a línea y
+            # solo se conservan las últimas OUTPUT_TAIL_LINES para el log de operaciones
+            output_tail = deque(maxlen=OUTPUT_TAIL_LINES)
+            
+            # El hijo agrega sus operaciones al mismo operations.jsonl: se vacía el
+            # buffer antes para que las líneas de ambos procesos no se mezclen
+            with self._ops_lock:
+                self._ops_fh.flush()
+            child_offset = os.path.getsize(self.operations_stream)
+            env = {**os.environ, SESSION_ENV_VAR: self.session_name}
+            
+            with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  text=True, bufsize=1, env=env) as proc:
+                for line in proc.stdout:
+                    line = line.rstrip()
+                    self.logger.info(line)
+                    output_tail.append(line)
+                returncode = proc.wait()
+            
+            self._merge_child_operations(child_offset)
             
-            # Ejecutar comando
-            result = subprocess.run(command, shell=True, capture_output=True, text=True)
+            output = "\n".join(output_tail)
             
-            if result.returncode == 0:
+            if returncode == 0:
                 self.log_operation("EXECUTION", {
                     "command": command,
                     "description": description,
-                    "output": result.stdout
+                    "output_tail": output
                 }, "SUCCESS")
                 
                 self.logger.info(f"✅ Comando ejecutado exitosamente: {description}")
-                return True, result.stdout
+                return True, output
             
             else:
                 self.log_operation("EXECUTION", {
                     "command": command,
                     "description": description,
-                    "error": result.stderr,
-                    "return_code": result.returncode
+                    "output_tail": output,
+                    "return_code": returncode
                 }, "FAILED")
                 
-                self.logger.error(f"❌ Error en comando: {description}")
-                self.logger.error(f"Error: {result.stderr}")
-                return False, result.stderr
+                self.logger.error(f"❌ Error en comando: {description} (código {returncode})")
+                return False, output
                 
         except Exception as e:
             self.log_operation("EXECUTION", {
@@ -122,30 +176,45 @@ class ExecutionManager:
             self.logger.error(f"💥 Excepción en comando: {description} - {str(e)}")
             return False, str(e)
     
+    def _merge_child_operations(self, offset):
+        """Agrega a self.operations las operaciones que un proceso hijo escribió en operations.jsonl desde `offset`"""
+        with open(self.operations_stream, 'rb') as f:
+            f.seek(offset)
+            lines = f.readlines()
+        
+        with self._ops_lock:
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    operation = loads_json(line)
+                except ValueError:
+                    # Última línea truncada si el hijo terminó a mitad de una escritura
+                    continue
+                self.operations.append(operation)
+                self._counts[operation['status']] = self._counts.get(operation['status'], 0) + 1
+    
     def generate_rollback_script(self):
         """Genera script de rollback basado en operaciones ejecutadas"""
-        rollback_statements = []
+        # Operaciones por timestamp (más reciente primero)
+        sorted_operations = sorted(self.operations, key=itemgetter('timestamp'), reverse=True)
         
-        # Ordenar operaciones por timestamp (más reciente primero)
-        sorted_operations = sorted(self.operations, 
-                                 key=lambda x: x['timestamp'], 
-                                 reverse=True)
+        rollback_statements = [
+            f"-- Rollback para vista creada en {op['timestamp']}\n"
+            f"DROP VIEW IF EXISTS `{op['details']['project_id']}.{op['details']['dataset']}.{op['details']['view_name']}`;\n"
+            for op in sorted_operations
+            if op['type'] == 'VIEW_CREATION' and op['status'] == 'SUCCESS'
+        ]
         
-        for op in sorted_operations:
-            if op['type'] == 'VIEW_CREATION' and op['status'] == 'SUCCESS':
-                details = op['details']
-                rollback_stmt = f"-- Rollback para vista creada en {op['timestamp']}\n"
-                rollback_stmt += f"DROP VIEW IF EXISTS `{details['project_id']}.{details['dataset']}.{details['view_name']}`;\n"
-                rollback_statements.append(rollback_stmt)
+        header = (
+            f"-- Script de Rollback para sesión: {self.session_name}\n"
+            f"-- Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"-- Total de operaciones: {len(self.operations)}\n\n"
+        )
         
-        # Escribir script de rollback
+        # Escribir script de rollback en una sola escritura
         with open(self.rollback_script, 'w', encoding='utf-8') as f:
-            f.write(f"-- Script de Rollback para sesión: {self.session_name}\n")
-            f.write(f"-- Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"-- Total de operaciones: {len(self.operations)}\n\n")
-            
-            for stmt in rollback_statements:
-                f.write(stmt + "\n")
+            f.write(header + "".join(stmt + "\n" for stmt in rollback_statements))
         
         self.logger.info(f"📄 Script de rollback generado: {self.rollback_script}")
         return rollback_statements
@@ -164,8 +233,8 @@ class ExecutionManager:
         }, "STARTED")
         
         try:
-            # Crear cliente BigQuery
-            client = bigquery.Client(project=project_id)
+            # Cliente BigQuery compartido por proyecto
+            client = get_client(project_id)
             
             # Ejecutar SQL
             query_job = client.query(sql_content)
@@ -193,10 +262,98 @@ class ExecutionManager:
             self.logger.error(f"❌ Error creando vista {full_view_name}: {str(e)}")
             return False
     
+    @staticmethod
+    def _script_statement(sql_content):
+        """Sentencia lista para un script: sin líneas de comentario '--' finales ni ';' de cierre"""
+        lines = sql_content.strip().splitlines()
+        while lines and (not lines[-1].strip() or lines[-1].lstrip().startswith('--')):
+            lines.pop()
+        return "\n".join(lines).rstrip().rstrip(';')
+    
+    def create_views_batch(self, views):
+        """
+        Crea varias vistas en un único job (script multi-statement de BigQuery)
+        
+        `views` es una lista de dicts con las claves de create_view_with_rollback.
+        El script va dentro de BEGIN ... EXCEPTION: el handler devuelve
+        @@error.message de la sentencia que falló. Las sentencias ya ejecutadas
+        se identifican por sus jobs hijos y las vistas restantes se crean una a
+        una para diagnosticar.
+        Retorna {view_name: éxito}.
+        """
+        if not views:
+            return {}
+        
+        self.log_operation("VIEW_BATCH", {
+            "views": [view['view_name'] for view in views],
+            "description": f"Creación en lote de {len(views)} vistas"
+        }, "STARTED")
+        
+        # ';' en su propia línea: un comentario '--' al final de una sentencia no lo absorbe
+        script = (
+            "BEGIN\n"
+            + "".join(self._script_statement(view['sql_content']) + "\n;\n" for view in views)
+            + "EXCEPTION WHEN ERROR THEN\n"
+            + "  SELECT @@error.message AS error_message, @@error.statement_text AS statement_text;\n"
+            + "END;"
+        )
+        client = get_client(views[0]['project_id'])
+        query_job = None
+        
+        try:
+            query_job = client.query(script)
+            # Sin error, la última sentencia es un DDL y no devuelve filas
+            rows = list(query_job.result())
+            failed_error = rows[0]['error_message'] if rows else None
+        except Exception as e:
+            failed_error = str(e)
+        
+        done, failed_known = len(views), False
+        if failed_error is not None:
+            # Cada sentencia del script es un job hijo: las vistas creadas son los hijos
+            # sin error previos al primero que falló (el SELECT del handler va después)
+            children = []
+            if query_job is not None:
+                children = sorted(client.list_jobs(parent_job=query_job), key=lambda job: job.created)
+            done = sum(1 for _ in takewhile(lambda job: job.error_result is None, children))
+            failed_known = done < len(children)
+            done = min(done, len(views))
+        
+        results = {}
+        for i, view in enumerate(views):
+            details = {
+                "project_id": view['project_id'],
+                "dataset": view['dataset'],
+                "view_name": view['view_name'],
+                "description": view['description']
+            }
+            full_view_name = f"`{view['project_id']}.{view['dataset']}.{view['view_name']}`"
+            
+            if i < done:
+                self.log_operation("VIEW_CREATION", details, "SUCCESS")
+                self.logger.info(f"✅ Vista creada exitosamente: {full_view_name}")
+                results[view['view_name']] = True
+            elif i == done and failed_known:
+                self.log_operation("VIEW_CREATION", {**details, "error": failed_error}, "FAILED")
+                self.logger.error(f"❌ Error creando vista {full_view_name}: {failed_error}")
+                results[view['view_name']] = False
+            else:
+                # El script se detuvo antes de llegar a esta vista (o no se pudo ejecutar)
+                results[view['view_name']] = self.create_view_with_rollback(**view)
+        
+        self.log_operation("VIEW_BATCH", {
+            "views": [view['view_name'] for view in views],
+            "job_id": query_job.job_id if query_job is not None else None,
+            "error": failed_error,
+            "created": sum(results.values())
+        }, "SUCCESS" if failed_error is None else "FAILED")
+        
+        return results
+    
     def validate_view_exists(self, project_id, dataset, view_name):
         """Valida que una vista existe y es accesible"""
         try:
-            client = bigquery.Client(project=project_id)
+            client = get_client(project_id)
             table_ref = client.dataset(dataset).table(view_name)
             table = client.get_table(table_ref)
             
@@ -209,9 +366,10 @@ class ExecutionManager:
     
     def get_session_summary(self):
         """Obtiene resumen de la sesión"""
+        # Contadores mantenidos por log_operation (sin recorrer self.operations)
         total_ops = len(self.operations)
-        successful_ops = len([op for op in self.operations if op['status'] == 'SUCCESS'])
-        failed_ops = len([op for op in self.operations if op['status'] == 'FAILED'])
+        successful_ops = self._counts['SUCCESS']
+        failed_ops = self._counts['FAILED']
         
         summary = {
             'session_name': self.session_name,
@@ -254,13 +412,23 @@ class ExecutionManager:
     def cleanup_session(self):
         """Limpia archivos temporales de la sesión"""
         try:
+            with self._ops_lock:
+                self._ops_fh.flush()
+            
+            if self.is_child:
+                # El padre genera operations.json, el rollback y el resumen con las operaciones de ambos
+                self.logger.info(f"🔗 Operaciones registradas en la sesión padre: {self.session_name}")
+                return
+            
             # Generar script de rollback final
             self.generate_rollback_script()
             
+            # Log completo de operaciones, escrito una sola vez
+            write_json(self.operations, self.operations_log)
+            
             # Crear archivo de resumen
             summary_file = f"{self.session_dir}/session_summary.json"
-            with open(summary_file, 'w', encoding='utf-8') as f:
-                json.dump(self.get_session_summary(), f, indent=2, ensure_ascii=False)
+            write_json(self.get_session_summary(), summary_file)
             
             self.logger.info(f"🧹 Sesión finalizada y limpiada: {self.session_name}")
             
@@ -288,7 +456,7 @@ def main():
         if command == "test":
             manager.logger.info("🧪 Iniciando prueba con análisis de tabla")
             success, output = manager.execute_safe(
-                "python test_single_table_analysis.py",
+                [sys.executable, "test_single_table_analysis.py"],
                 "Análisis de tabla individual",
                 "echo 'No rollback necesario para análisis'"
             )
@@ -296,7 +464,7 @@ def main():
         elif command == "silver":
             manager.logger.info("🔄 Iniciando generación de vistas Silver")
             success, output = manager.execute_safe(
-                "python generate_silver_views.py",
+                [sys.executable, "generate_silver_views.py"],
                 "Generación de vistas Silver",
                 "python rollback_manager.py silver"
             )
@@ -304,7 +472,7 @@ def main():
         elif command == "consolidated":
             manager.logger.info("🔄 Iniciando generación de vistas consolidadas")
             success, output = manager.execute_safe(
-                "python generate_central_consolidated_views.py",
+                [sys.executable, "generate_central_consolidated_views.py"],
                 "Generación de vistas consolidadas",
                 "python rollback_manager.py consolidated"
             )
@@ -314,19 +482,19 @@ def main():
             
             # Paso 1: Análisis
             success1, _ = manager.execute_safe(
-                "python analyze_data_types.py",
+                [sys.executable, "analyze_data_types.py"],
                 "Análisis de tipos de datos"
             )
             
             # Paso 2: Vistas Silver
             success2, _ = manager.execute_safe(
-                "python generate_silver_views.py",
+                [sys.executable, "generate_silver_views.py"],
                 "Generación de vistas Silver"
             )
             
             # Paso 3: Vistas consolidadas
             success3, _ = manager.execute_safe(
-                "python generate_central_consolidated_views.py",
+                [sys.executable, "generate_central_consolidated_views.py"],
                 "Generación de vistas consolidadas"
             )
             
@@ -12,6 +12,8 @@ from google.cloud import bigquery
 import pandas as pd
 from datetime import datetime
 import os
+import warnings
+from execution_manager import ExecutionManager
 warnings.filterwarnings('ignore')
 
 # Configuración
@@ -105,26 +107,39 @@ def generate_all_consolidated_views():
     print("=" * 80)
     
     generated_files = []
+    views = []
     
     for table_name in tables_to_process:
         try:
-            # Generar y ejecutar SQL directamente
-            sql_content = generate_consolidated_view_sql(table_name, companies_df)
-            
-            # Ejecutar vista directamente en BigQuery
-            try:
-                print(f"  🔄 Creando vista consolidada: {PROJECT_CENTRAL}.silver.vw_consolidated_{table_name}")
-                query_job = client.query(sql_content)
-                query_job.result()  # Esperar a que termine
-                print(f"  ✅ Vista consolidada creada: {table_name}")
-                generated_files.append(f"SUCCESS: {table_name}")
-            except Exception as e:
-                print(f"  ❌ Error creando vista consolidada {table_name}: {str(e)}")
-                generated_files.append(f"ERROR: {table_name}")
-            
+            # Generar SQL (las vistas se crean después en un único script)
+            views.append({
+                'project_id': PROJECT_CENTRAL,
+                'dataset': 'silver',
+                'view_name': f"vw_consolidated_{table_name}",
+                'sql_content': generate_consolidated_view_sql(table_name, companies_df),
+                'description': f"Vista consolidada: {table_name}"
+            })
         except Exception as e:
             print(f"  ❌ Error en {table_name}: {str(e)}")
     
+    # Crear todas las vistas en un solo job de BigQuery, registradas para rollback.
+    # Lanzado desde execution_manager.py, ExecutionManager se une a la sesión padre
+    print(f"  🔄 Creando {len(views)} vistas consolidadas en {PROJECT_CENTRAL}.silver")
+    execution_manager = ExecutionManager()
+    try:
+        results = execution_manager.create_views_batch(views)
+    finally:
+        execution_manager.cleanup_session()
+    
+    for view in views:
+        table_name = view['view_name'][len("vw_consolidated_"):]
+        if results.get(view['view_name']):
+            print(f"  ✅ Vista consolidada creada: {table_name}")
+            generated_files.append(f"SUCCESS: {table_name}")
+        else:
+            print(f"  ❌ Error creando vista consolidada {table_name}")
+            generated_files.append(f"ERROR: {table_name}")
+    
     # Crear archivo maestro que ejecute todas las vistas
     master_filename = f"{output_dir}/EXECUTE_ALL_CONSOLIDATED_VIEWS.sql"
     with open(master_filename, 'w', encoding='utf-8') as f:
@@ -689,12 +689,15 @@ def generate_all_silver_views(force_recreate=False):
         
         # Actualizar estado
         if company_success:
-            status_manager.update_company_status(company_id, status_manager.STATUS['COMPLETED'])
+            status_manager.queue_company_status(company_id, status_manager.STATUS['COMPLETED'])
             # print(f"  ✅ {company_name}: Estado actualizado a COMPLETED")
         else:
-            status_manager.update_company_status(company_id, status_manager.STATUS['ERROR'])
+            status_manager.queue_company_status(company_id, status_manager.STATUS['ERROR'])
             print(f"  ❌ {company_name}: Estado actualizado a ERROR")
     
+    # Enviar todas las actualizaciones de estado encoladas en un solo MERGE
+    status_manager.flush()
+    
     # Mostrar resumen de estados
     status_manager.print_consolidation_summary()
     
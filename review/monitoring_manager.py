@@ -8,26 +8,52 @@ Permite validar que las vistas existen, son accesibles y tienen el esquema corre
 
 import sys
 import os
-import json
 import logging
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
-import pandas as pd
 from google.cloud import bigquery
 
 # Agregar el directorio actual al path para importar config
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import *
+from _bq import get_client
+from _jsonio import dump_json_line, write_json
+
+# Número de validaciones concurrentes (I/O contra la API de BigQuery)
+MAX_WORKERS = 16
+
+# Config de las consultas de prueba: aprovecha la caché de resultados de BigQuery (24h)
+_PROBE_JOB_CONFIG = bigquery.QueryJobConfig(
+    use_query_cache=True,
+    priority=bigquery.QueryPriority.INTERACTIVE
+)
 
 class MonitoringManager:
     """
     Gestor de monitoreo y validación de vistas
     """
     
+    # Plantillas SQL por vista (centralizadas para auditar el SQL que se ejecuta)
+    _COUNT_TMPL = "SELECT COUNT(*) AS row_count FROM `{p}.{d}.{v}`"
+    _COMPANY_COUNT_TMPL = """
+            SELECT '{v}' AS view_name, company_name, COUNT(*) AS row_count
+            FROM `{p}.{d}.{v}`
+            GROUP BY company_name
+            """
+    
     def __init__(self):
         self.logger = self.setup_logging()
-        self.client = bigquery.Client(project=PROJECT_SOURCE)
+        # Cliente compartido: pool HTTP dimensionado para los workers (_bq.HTTP_POOL_SIZE)
+        self.client = get_client(PROJECT_SOURCE)
+        self._schema_cache = {}
+        self._companies_cache = None
+        
+        # Detalle de resultados en NDJSON (una línea por vista validada)
+        self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.results_file = f"monitoring_report_{self.run_id}.ndjson"
         self.logger.info("📊 MonitoringManager iniciado")
     
     def setup_logging(self):
@@ -39,8 +65,22 @@ class MonitoringManager:
         )
         return logging.getLogger(__name__)
     
-    def get_companies_info(self):
-        """Obtiene información de las compañías activas"""
+    def get_companies_info(self, force_refresh=False):
+        """
+        Obtiene información de las compañías activas.
+        
+        El resultado se cachea en la instancia para que varios monitor_* en una misma
+        ejecución no repitan la consulta de metadata.
+        
+        Args:
+            force_refresh (bool): Ignora la caché y vuelve a consultar BigQuery
+        """
+        if self._companies_cache is None or force_refresh:
+            self._companies_cache = self._fetch_companies()
+        return self._companies_cache
+    
+    def _fetch_companies(self):
+        """Consulta las compañías activas en la tabla de metadata"""
         query = f"""
             SELECT company_id, company_name, company_project_id
             FROM `{PROJECT_SOURCE}.{DATASET_NAME}.{TABLE_NAME}`
@@ -48,50 +88,247 @@ class MonitoringManager:
             ORDER BY company_id
             LIMIT {MAX_COMPANIES_FOR_TEST}
         """
-        return pd.DataFrame([dict(row) for row in self.client.query(query).result()])
+        # Las filas de BigQuery ya permiten acceso por atributo (row.company_name)
+        return list(self.client.query(query).result())
     
-    def validate_silver_view(self, project_id, view_name, expected_fields=None):
-        """Valida una vista Silver específica"""
+    def _bulk_probe_dataset(self, project_id, dataset):
+        """
+        Obtiene row_count/size_bytes de todas las vistas vw_* de un dataset en una sola consulta.
+        
+        __TABLES__ incluye tablas (type=1) y vistas (type=2); para las vistas solo confirma
+        existencia, ya que no tienen row_count materializado.
+        
+        Returns:
+            dict: {table_name: {'row_count', 'size_bytes', 'is_view'}} o None si falla
+        """
+        query = f"""
+            SELECT table_id AS table_name, row_count, size_bytes, type,
+                   creation_time, last_modified_time
+            FROM `{project_id}.{dataset}.__TABLES__`
+            WHERE table_id LIKE 'vw_%'
+        """
         try:
-            # Obtener información de la vista
-            table_ref = self.client.dataset('silver', project=project_id).table(view_name)
-            table = self.client.get_table(table_ref)
-            
-            validation_result = {
-                'project_id': project_id,
-                'view_name': view_name,
-                'exists': True,
-                'field_count': len(table.schema),
-                'fields': [field.name for field in table.schema],
-                'size_bytes': table.num_bytes,
-                'num_rows': table.num_rows,
-                'created': table.created.isoformat() if table.created else None,
-                'modified': table.modified.isoformat() if table.modified else None,
-                'errors': []
+            return {
+                row.table_name: {
+                    'row_count': row.row_count,
+                    'size_bytes': row.size_bytes,
+                    'is_view': row.type == 2,
+                    'created': self._epoch_ms_to_iso(row.creation_time),
+                    'modified': self._epoch_ms_to_iso(row.last_modified_time)
+                }
+                for row in self.client.query(query).result()
             }
+        except Exception as e:
+            self.logger.warning(f"⚠️  No se pudo consultar __TABLES__ en {project_id}.{dataset}: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _epoch_ms_to_iso(epoch_ms):
+        """Convierte milisegundos epoch (formato de __TABLES__) a ISO 8601"""
+        if epoch_ms is None:
+            return None
+        return datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc).isoformat()
+    
+    def _fetch_all_schemas(self, project_id, dataset):
+        """
+        Obtiene los campos de todas las vistas vw_* de un dataset con una sola consulta
+        a INFORMATION_SCHEMA.COLUMNS (en lugar de un get_table por vista).
+        
+        El resultado se cachea por (project_id, dataset).
+        
+        Returns:
+            dict: {table_name: [campos en orden]} o None si falla
+        """
+        cache_key = (project_id, dataset)
+        if cache_key in self._schema_cache:
+            return self._schema_cache[cache_key]
+        
+        query = f"""
+            SELECT table_name, ARRAY_AGG(column_name ORDER BY ordinal_position) AS fields
+            FROM `{project_id}.{dataset}.INFORMATION_SCHEMA.COLUMNS`
+            WHERE table_name LIKE 'vw_%'
+            GROUP BY table_name
+        """
+        try:
+            schemas = {row.table_name: list(row.fields) for row in self.client.query(query).result()}
+        except Exception as e:
+            self.logger.warning(f"⚠️  No se pudo consultar INFORMATION_SCHEMA.COLUMNS en {project_id}.{dataset}: {str(e)}")
+            schemas = None
+        
+        self._schema_cache[cache_key] = schemas
+        return schemas
+    
+    def _fetch_company_coverage(self, project_id, dataset, view_names):
+        """
+        Obtiene el conteo de filas por compañía de varias vistas consolidadas en un solo job
+        (UNION ALL) en lugar de un GROUP BY por vista.
+        
+        Returns:
+            dict: {view_name: {company_name: row_count}} o None si falla
+        """
+        query = "\nUNION ALL\n".join(
+            self._COMPANY_COUNT_TMPL.format(p=project_id, d=dataset, v=view_name)
+            for view_name in view_names
+        )
+        try:
+            coverage = {view_name: {} for view_name in view_names}
+            for row in self.client.query(query).result():
+                coverage[row.view_name][row.company_name] = row.row_count
+            return coverage
+        except Exception as e:
+            self.logger.warning(f"⚠️  No se pudo consultar la cobertura por compañía en {project_id}.{dataset}: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _metadata_cache_warnings(query_job):
+        """
+        Revisa si las tablas BigLake subyacentes usaron la caché de metadata.
+        
+        QueryJob no expone metadataCacheStatistics con una propiedad pública: este es
+        el único acceso a _properties del módulo y tolera que la librería lo cambie.
+        
+        Returns:
+            list: Advertencias por cada tabla que no usó la caché (vacía si todo OK)
+        """
+        properties = getattr(query_job, '_properties', None) or {}
+        statistics = properties.get('statistics', {}).get('query', {})
+        cache_stats = statistics.get('metadataCacheStatistics') or {}
+        
+        warnings = []
+        for usage in cache_stats.get('tableMetadataCacheUsage', []):
+            unused_reason = usage.get('unusedReason')
+            if unused_reason:
+                table = usage.get('tableReference', {}).get('tableId', '?')
+                warnings.append(f"Caché de metadata no usada en {table}: {unused_reason}")
+        return warnings
+    
+    def enable_metadata_caching(self, table_fqn, max_staleness="INTERVAL 1 HOUR"):
+        """
+        Habilita la caché de metadata en una tabla BigLake subyacente a una vista Silver.
+        
+        Evita el listado de archivos externos en cada consulta; solo aplica a tablas BigLake
+        (las tablas nativas rechazan la opción).
+        
+        Args:
+            table_fqn (str): Tabla en formato project.dataset.table
+            max_staleness (str): Intervalo de vigencia de la caché
+        """
+        ddl = f"ALTER TABLE `{table_fqn}` SET OPTIONS(max_staleness = {max_staleness})"
+        try:
+            self.client.query(ddl).result()
+            self.logger.info(f"✅ Caché de metadata habilitada en {table_fqn} ({max_staleness})")
+            return True
+        except Exception as e:
+            self.logger.error(f"❌ No se pudo habilitar la caché de metadata en {table_fqn}: {str(e)}")
+            return False
+    
+    def _apply_probe(self, validation_result, probe):
+        """
+        Completa el resultado de validación con los datos pre-consultados de __TABLES__
+        
+        __TABLES__ solo confirma que el objeto existe: no se ejecuta ninguna consulta,
+        así que query_test queda en None (omitida), no en True.
+        """
+        info = probe[validation_result['view_name']]
+        validation_result['query_test'] = None
+        validation_result['actual_rows'] = None if info['is_view'] else info['row_count']
+    
+    def _validate_view(self, project_id, dataset, view_name, *, expected_fields=None,
+                       post_checks=(), probe=None, schemas=None):
+        """
+        Validación común de una vista: metadata/esquema, campos esperados y consulta de prueba.
+        
+        Args:
+            project_id (str): Proyecto de la vista
+            dataset (str): Dataset de la vista ('silver' o 'central-silver')
+            view_name (str): Nombre de la vista
+            expected_fields (iterable): Campos esperados (opcional)
+            post_checks (iterable): Callables (validation_result) -> None ejecutados
+                                    salvo que la consulta de prueba haya fallado
+            probe (dict): Resultado de _bulk_probe_dataset del dataset (opcional)
+            schemas (dict): Resultado de _fetch_all_schemas del dataset (opcional)
+        """
+        try:
+            fields = schemas.get(view_name) if schemas else None
+            table_type = None
+            
+            if fields is not None:
+                # Esquema pre-consultado vía INFORMATION_SCHEMA.COLUMNS
+                info = (probe or {}).get(view_name, {})
+                validation_result = {
+                    'project_id': project_id,
+                    'view_name': view_name,
+                    'exists': True,
+                    'field_count': len(fields),
+                    'fields': fields,
+                    'size_bytes': info.get('size_bytes'),
+                    'num_rows': info.get('row_count'),
+                    'created': info.get('created'),
+                    'modified': info.get('modified'),
+                    'errors': [],
+                    'warnings': []
+                }
+            else:
+                # Obtener información de la vista (tables.get, sin job de consulta)
+                table = self.client.get_table(f"{project_id}.{dataset}.{view_name}")
+                fields = [field.name for field in table.schema]
+                table_type = table.table_type
+                
+                validation_result = {
+                    'project_id': project_id,
+                    'view_name': view_name,
+                    'exists': True,
+                    'field_count': len(fields),
+                    'fields': fields,
+                    'size_bytes': table.num_bytes,
+                    'num_rows': table.num_rows,
+                    'created': table.created.isoformat() if table.created else None,
+                    'modified': table.modified.isoformat() if table.modified else None,
+                    'errors': [],
+                    'warnings': []
+                }
             
             # Validar campos esperados si se proporcionan
             if expected_fields:
-                missing_fields = set(expected_fields) - set(validation_result['fields'])
-                extra_fields = set(validation_result['fields']) - set(expected_fields)
+                # expected_fields llega como frozenset desde monitor_silver_views
+                if not isinstance(expected_fields, frozenset):
+                    expected_fields = frozenset(expected_fields)
+                actual_fields = frozenset(validation_result['fields'])
+                missing_fields = expected_fields - actual_fields
+                extra_fields = actual_fields - expected_fields
                 
                 if missing_fields:
-                    validation_result['errors'].append(f"Campos faltantes: {list(missing_fields)}")
+                    validation_result['errors'].append(f"Campos faltantes: {sorted(missing_fields)}")
                 
                 if extra_fields:
-                    validation_result['errors'].append(f"Campos extra: {list(extra_fields)}")
+                    validation_result['errors'].append(f"Campos extra: {sorted(extra_fields)}")
             
-            # Probar consulta básica
-            try:
-                test_query = f"SELECT COUNT(*) as row_count FROM `{project_id}.silver.{view_name}` LIMIT 1"
-                query_job = self.client.query(test_query)
-                result = query_job.result()
-                row_count = list(result)[0].row_count
-                validation_result['query_test'] = True
-                validation_result['actual_rows'] = row_count
-            except Exception as e:
-                validation_result['query_test'] = False
-                validation_result['errors'].append(f"Error en consulta de prueba: {str(e)}")
+            # Probar consulta básica (se omite si ya se consultó __TABLES__ del dataset)
+            if probe and view_name in probe:
+                self._apply_probe(validation_result, probe)
+            elif table_type in ('TABLE', 'MATERIALIZED_VIEW') and validation_result['num_rows'] is not None:
+                # Conteo desde el numRows que ya trajo tables.get (sin job ni otra llamada);
+                # igual que con __TABLES__, es metadata y no una consulta de prueba
+                validation_result['actual_rows'] = validation_result['num_rows']
+                validation_result['query_test'] = None
+            else:
+                try:
+                    test_query = self._COUNT_TMPL.format(p=project_id, d=dataset, v=view_name)
+                    query_job = self.client.query(test_query, job_config=_PROBE_JOB_CONFIG)
+                    result = query_job.result()
+                    row_count = list(result)[0].row_count
+                    validation_result['query_test'] = True
+                    validation_result['actual_rows'] = row_count
+                    validation_result['cache_hit'] = query_job.cache_hit
+                    validation_result['warnings'].extend(self._metadata_cache_warnings(query_job))
+                except Exception as e:
+                    validation_result['query_test'] = False
+                    validation_result['errors'].append(f"Error en consulta de prueba: {str(e)}")
+            
+            # query_test None = consulta omitida (solo existencia): los post_checks consultan por sí mismos
+            if validation_result['query_test'] is not False:
+                for check in post_checks:
+                    check(validation_result)
             
             return validation_result
             
@@ -103,76 +340,93 @@ class MonitoringManager:
                 'errors': [f"Vista no existe o no es accesible: {str(e)}"]
             }
     
-    def validate_consolidated_view(self, project_id, view_name, expected_companies=None):
+    def validate_silver_view(self, project_id, view_name, expected_fields=None, probe=None, schemas=None):
+        """Valida una vista Silver específica"""
+        return self._validate_view(
+            project_id, 'silver', view_name,
+            expected_fields=expected_fields, probe=probe, schemas=schemas
+        )
+    
+    def validate_consolidated_view(self, project_id, view_name, expected_companies=None, probe=None, coverage=None):
         """Valida una vista consolidada específica"""
+        post_checks = []
+        if expected_companies:
+            post_checks.append(partial(
+                self._check_company_coverage,
+                project_id=project_id,
+                expected_companies=expected_companies,
+                coverage=coverage
+            ))
+        
+        return self._validate_view(
+            project_id, 'central-silver', view_name,
+            post_checks=post_checks, probe=probe
+        )
+    
+    def _check_company_coverage(self, validation_result, project_id, expected_companies, coverage=None):
+        """Valida que la vista consolidada contiene datos de las compañías esperadas"""
+        view_name = validation_result['view_name']
         try:
-            # Obtener información de la vista
-            table_ref = self.client.dataset('central-silver', project=project_id).table(view_name)
-            table = self.client.get_table(table_ref)
-            
-            validation_result = {
-                'project_id': project_id,
-                'view_name': view_name,
-                'exists': True,
-                'field_count': len(table.schema),
-                'fields': [field.name for field in table.schema],
-                'size_bytes': table.num_bytes,
-                'num_rows': table.num_rows,
-                'created': table.created.isoformat() if table.created else None,
-                'modified': table.modified.isoformat() if table.modified else None,
-                'errors': []
-            }
-            
-            # Probar consulta básica
-            try:
-                test_query = f"SELECT COUNT(*) as row_count FROM `{project_id}.central-silver.{view_name}` LIMIT 1"
-                query_job = self.client.query(test_query)
+            if coverage and view_name in coverage:
+                # Cobertura pre-consultada en un único job para todas las vistas
+                company_data = coverage[view_name]
+            else:
+                companies_query = self._COMPANY_COUNT_TMPL.format(p=project_id, d='central-silver', v=view_name)
+                query_job = self.client.query(companies_query, job_config=_PROBE_JOB_CONFIG)
                 result = query_job.result()
-                row_count = list(result)[0].row_count
-                validation_result['query_test'] = True
-                validation_result['actual_rows'] = row_count
-            except Exception as e:
-                validation_result['query_test'] = False
-                validation_result['errors'].append(f"Error en consulta de prueba: {str(e)}")
-            
-            # Validar que contiene datos de las compañías esperadas
-            if expected_companies and validation_result['query_test']:
-                try:
-                    companies_query = f"""
-                        SELECT DISTINCT company_name, COUNT(*) as row_count
-                        FROM `{project_id}.central-silver.{view_name}`
-                        GROUP BY company_name
-                        ORDER BY company_name
-                    """
-                    query_job = self.client.query(companies_query)
-                    result = query_job.result()
-                    
-                    company_data = {row.company_name: row.row_count for row in result}
-                    validation_result['company_data'] = company_data
-                    
-                    missing_companies = set(expected_companies) - set(company_data.keys())
-                    if missing_companies:
-                        validation_result['errors'].append(f"Compañías faltantes: {list(missing_companies)}")
-                        
-                except Exception as e:
-                    validation_result['errors'].append(f"Error validando datos por compañía: {str(e)}")
+                
+                company_data = {row.company_name: row.row_count for row in result}
             
-            return validation_result
+            validation_result['company_data'] = company_data
             
+            missing_companies = set(expected_companies) - set(company_data.keys())
+            if missing_companies:
+                validation_result['errors'].append(f"Compañías faltantes: {list(missing_companies)}")
+                
         except Exception as e:
-            return {
-                'project_id': project_id,
-                'view_name': view_name,
-                'exists': False,
-                'errors': [f"Vista no existe o no es accesible: {str(e)}"]
-            }
+            validation_result['errors'].append(f"Error validando datos por compañía: {str(e)}")
+    
+    def _new_results_summary(self):
+        """Contadores en memoria de un monitoreo; el detalle se escribe en el NDJSON"""
+        return {
+            'total': 0,
+            'errors': 0,
+            'failures': [],
+            'warnings': 0,
+            'cache_probes': 0,
+            'cache_hits': 0
+        }
+    
+    def _record_result(self, results_file, summary, kind, result):
+        """Escribe un resultado en el NDJSON y actualiza solo los contadores del resumen"""
+        results_file.write(dump_json_line({'kind': kind, **result}))
+        
+        summary['total'] += 1
+        if 'cache_hit' in result:
+            summary['cache_probes'] += 1
+            summary['cache_hits'] += int(bool(result['cache_hit']))
+        # Las advertencias (p.ej. caché de metadata no usada) no cuentan como errores
+        if result.get('warnings'):
+            summary['warnings'] += 1
+        if result['errors']:
+            summary['errors'] += 1
+            summary['failures'].append({
+                'company_name': result.get('company_name'),
+                'view_name': result['view_name'],
+                'errors': result['errors']
+            })
     
     def monitor_silver_views(self, table_name=None):
-        """Monitorea todas las vistas Silver"""
+        """
+        Monitorea todas las vistas Silver.
+        
+        Cada resultado se escribe en self.results_file (NDJSON) a medida que termina;
+        solo se mantienen en memoria los contadores y los errores.
+        """
         self.logger.info("🔍 Iniciando monitoreo de vistas Silver")
         
-        companies_df = self.get_companies_info()
-        monitoring_results = []
+        companies = self.get_companies_info()
+        summary = self._new_results_summary()
         
         # Obtener campos esperados si se especifica una tabla
         expected_fields = None
@@ -180,74 +434,133 @@ class MonitoringManager:
             # Aquí se podría obtener los campos esperados del análisis previo
             pass
         
-        for _, company in companies_df.iterrows():
-            project_id = company['company_project_id']
-            company_name = company['company_name']
+        # Se hashea una sola vez para todas las compañías
+        expected_fields = frozenset(expected_fields) if expected_fields else None
+        
+        if not table_name:
+            # Monitorear todas las vistas Silver (esto requeriría listar las vistas)
+            for company in companies:
+                self.logger.info(f"⚠️  Monitoreo de todas las vistas no implementado para {company.company_name}")
+            return summary
+        
+        view_name = f"vw_{table_name}"
+        targets = [
+            (company.company_project_id, company.company_name, view_name)
+            for company in companies
+        ]
+        
+        # Validar en paralelo: cada validación es I/O contra BigQuery
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+                open(self.results_file, 'ab') as results_file:
+            # Una sola consulta a __TABLES__ y a INFORMATION_SCHEMA.COLUMNS por proyecto
+            # en lugar de un COUNT y un get_table por vista
+            project_ids = list(dict.fromkeys(project_id for project_id, _, _ in targets))
+            probes = dict(zip(
+                project_ids,
+                executor.map(lambda project_id: self._bulk_probe_dataset(project_id, 'silver'), project_ids)
+            ))
+            schemas = dict(zip(
+                project_ids,
+                executor.map(lambda project_id: self._fetch_all_schemas(project_id, 'silver'), project_ids)
+            ))
             
-            if table_name:
-                view_name = f"vw_{table_name}"
-                result = self.validate_silver_view(project_id, view_name, expected_fields)
+            futures = {
+                executor.submit(
+                    self.validate_silver_view, project_id, view, expected_fields,
+                    probes.get(project_id), schemas.get(project_id)
+                ): (project_id, company_name, view)
+                for project_id, company_name, view in targets
+            }
+            for future in as_completed(futures):
+                _, company_name, _ = futures[future]
+                result = future.result()
                 result['company_name'] = company_name
                 result['table_name'] = table_name
-                monitoring_results.append(result)
-            else:
-                # Monitorear todas las vistas Silver (esto requeriría listar las vistas)
-                self.logger.info(f"⚠️  Monitoreo de todas las vistas no implementado para {company_name}")
+                self._record_result(results_file, summary, 'silver', result)
         
-        return monitoring_results
+        return summary
     
-    def monitor_consolidated_views(self):
-        """Monitorea todas las vistas consolidadas"""
+    def monitor_consolidated_views(self, table_names=None):
+        """
+        Monitorea las vistas consolidadas (todas las conocidas o solo table_names).
+        
+        Igual que monitor_silver_views, el detalle se escribe en self.results_file.
+        """
         self.logger.info("🔍 Iniciando monitoreo de vistas consolidadas")
         
-        companies_df = self.get_companies_info()
-        expected_companies = companies_df['company_name'].tolist()
+        companies = self.get_companies_info()
+        expected_companies = [company.company_name for company in companies]
         
-        monitoring_results = []
+        summary = self._new_results_summary()
         
         # Lista de tablas conocidas (se podría obtener dinámicamente)
-        known_tables = ['call', 'campaign', 'customer', 'job', 'invoice', 'appointment']
-        
-        for table_name in known_tables:
-            view_name = f"vw_consolidated_{table_name}"
-            result = self.validate_consolidated_view(
-                PROJECT_SOURCE, 
-                view_name, 
-                expected_companies
-            )
-            result['table_name'] = table_name
-            monitoring_results.append(result)
-        
-        return monitoring_results
+        known_tables = table_names or ['call', 'campaign', 'customer', 'job', 'invoice', 'appointment']
+        
+        # Una sola consulta a __TABLES__ para todo el dataset central-silver
+        probe = self._bulk_probe_dataset(PROJECT_SOURCE, 'central-silver')
+        
+        # Un único job con el conteo por compañía de todas las vistas existentes
+        coverage = None
+        if expected_companies:
+            view_names = [f"vw_consolidated_{table_name}" for table_name in known_tables]
+            if probe is not None:
+                view_names = [view_name for view_name in view_names if view_name in probe]
+            if view_names:
+                coverage = self._fetch_company_coverage(PROJECT_SOURCE, 'central-silver', view_names)
+        
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+                open(self.results_file, 'ab') as results_file:
+            futures = {
+                executor.submit(
+                    self.validate_consolidated_view,
+                    PROJECT_SOURCE,
+                    f"vw_consolidated_{table_name}",
+                    expected_companies,
+                    probe,
+                    coverage
+                ): table_name
+                for table_name in known_tables
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                result['table_name'] = futures[future]
+                self._record_result(results_file, summary, 'consolidated', result)
+        
+        return summary
     
     def generate_monitoring_report(self, silver_results=None, consolidated_results=None):
-        """Genera reporte de monitoreo"""
+        """
+        Genera el reporte resumen de monitoreo.
+        
+        El detalle por vista queda en results_file (NDJSON, cargable con `bq load`);
+        el reporte solo incluye contadores y los errores.
+        """
+        silver_results = silver_results or self._new_results_summary()
+        consolidated_results = consolidated_results or self._new_results_summary()
+        
         report = {
-            'timestamp': datetime.now().isoformat(),
-            'silver_views': silver_results or [],
-            'consolidated_views': consolidated_results or [],
+            'timestamp': datetime.now(),
+            'results_file': self.results_file,
+            'silver_failures': silver_results['failures'],
+            'consolidated_failures': consolidated_results['failures'],
             'summary': {
-                'total_silver_views': len(silver_results) if silver_results else 0,
-                'total_consolidated_views': len(consolidated_results) if consolidated_results else 0,
-                'silver_errors': 0,
-                'consolidated_errors': 0
+                'total_silver_views': silver_results['total'],
+                'total_consolidated_views': consolidated_results['total'],
+                'silver_errors': silver_results['errors'],
+                'consolidated_errors': consolidated_results['errors'],
+                'views_with_warnings': silver_results['warnings'] + consolidated_results['warnings'],
+                'cache_probes': silver_results['cache_probes'] + consolidated_results['cache_probes'],
+                'cache_hits': silver_results['cache_hits'] + consolidated_results['cache_hits']
             }
         }
         
-        # Calcular errores
-        if silver_results:
-            report['summary']['silver_errors'] = len([r for r in silver_results if r['errors']])
-        
-        if consolidated_results:
-            report['summary']['consolidated_errors'] = len([r for r in consolidated_results if r['errors']])
-        
         return report
     
     def print_monitoring_summary(self, report):
         """Imprime resumen de monitoreo"""
         summary = report['summary']
         
-        print(f"\n📊 REPORTE DE MONITOREO - {report['timestamp']}")
+        print(f"\n📊 REPORTE DE MONITOREO - {report['timestamp'].isoformat()}")
         print("=" * 60)
         
         print(f"📋 Vistas Silver: {summary['total_silver_views']}")
@@ -258,37 +571,41 @@ class MonitoringManager:
         print(f"   ✅ Sin errores: {summary['total_consolidated_views'] - summary['consolidated_errors']}")
         print(f"   ❌ Con errores: {summary['consolidated_errors']}")
         
+        if summary['views_with_warnings']:
+            print(f"\n⚠️  Vistas con advertencias: {summary['views_with_warnings']} (detalle en {report['results_file']})")
+        
+        # Consultas de prueba servidas desde la caché de resultados de BigQuery
+        if summary['cache_probes']:
+            print(f"\n💾 Consultas de prueba desde caché: {summary['cache_hits']}/{summary['cache_probes']}")
+        
         # Mostrar errores detallados
         if summary['silver_errors'] > 0:
             print(f"\n❌ ERRORES EN VISTAS SILVER:")
-            for result in report['silver_views']:
-                if result['errors']:
-                    print(f"  - {result['company_name']}.{result['view_name']}: {', '.join(result['errors'])}")
+            for result in report['silver_failures']:
+                print(f"  - {result['company_name']}.{result['view_name']}: {', '.join(result['errors'])}")
         
         if summary['consolidated_errors'] > 0:
             print(f"\n❌ ERRORES EN VISTAS CONSOLIDADAS:")
-            for result in report['consolidated_views']:
-                if result['errors']:
-                    print(f"  - {result['view_name']}: {', '.join(result['errors'])}")
+            for result in report['consolidated_failures']:
+                print(f"  - {result['view_name']}: {', '.join(result['errors'])}")
         
         # Guardar reporte
-        report_file = f"monitoring_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(report_file, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2, ensure_ascii=False)
+        report_file = f"monitoring_report_{self.run_id}.json"
+        write_json(report, report_file)
         
         print(f"\n📄 Reporte guardado: {report_file}")
+        print(f"📄 Detalle por vista: {report['results_file']}")
     
     def validate_specific_table(self, table_name):
         """Valida una tabla específica en todas las compañías"""
         self.logger.info(f"🔍 Validando tabla específica: {table_name}")
         
         silver_results = self.monitor_silver_views(table_name)
-        consolidated_results = self.monitor_consolidated_views()
         
-        # Filtrar solo la tabla específica en consolidadas
-        table_consolidated = [r for r in consolidated_results if r.get('table_name') == table_name]
+        # Solo la vista consolidada de esta tabla (sin barrer todas las conocidas)
+        consolidated_results = self.monitor_consolidated_views(table_names=[table_name])
         
-        report = self.generate_monitoring_report(silver_results, table_consolidated)
+        report = self.generate_monitoring_report(silver_results, consolidated_results)
         self.print_monitoring_summary(report)
         
         return report
@@ -302,6 +619,7 @@ def main():
         print("  consolidated            - Monitorear vistas consolidadas")
         print("  all                     - Monitorear todo")
         print("  table <table_name>      - Validar tabla específica")
+        print("  cache <project.dataset.table> - Habilitar caché de metadata (BigLake)")
         print("\nEjemplos:")
         print("  python monitoring_manager.py silver")
         print("  python monitoring_manager.py silver call")
@@ -341,6 +659,14 @@ def main():
             table_name = sys.argv[2]
             report = monitor.validate_specific_table(table_name)
             
+        elif command == "cache":
+            if len(sys.argv) < 3:
+                print("❌ Debe especificar la tabla BigLake (project.dataset.table)")
+                sys.exit(1)
+            
+            if not monitor.enable_metadata_caching(sys.argv[2]):
+                sys.exit(1)
+            
         else:
             print(f"❌ Comando desconocido: {command}")
             sys.exit(1)
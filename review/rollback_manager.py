@@ -13,32 +13,94 @@ import logging
 from datetime import datetime
 from pathlib import Path
 import subprocess
-from google.cloud import bigquery
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import ijson
+except ImportError:  # ijson es opcional; sin él se parsea el archivo completo
+    ijson = None
 
 # Agregar el directorio actual al path para importar config
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import *
+from _jsonio import loads_json, read_json
+
+# Proyectos cuyos DROP se ejecutan en paralelo
+MAX_WORKERS = 16
+
+# Directorio con una subcarpeta por sesión de ExecutionManager
+SESSIONS_DIR = Path("execution_sessions")
+
+# Fragmentos constantes de cada sentencia de rollback
+DROP_PREFIX = "DROP VIEW IF EXISTS "
+DROP_SUFFIX = ";"
+
+# Cada cuántas vistas se registra el progreso cuando no se usa --verbose
+PROGRESS_EVERY = 100
+
+# Sesiones que list_sessions parsea en paralelo
+LIST_WORKERS = 8
+
+# Cache de resúmenes de sesión dentro de SESSIONS_DIR
+LIST_CACHE_FILE = ".list_cache.json"
+
+def iter_json_items(path):
+    """Itera los objetos de un arreglo JSON sin materializarlo (ijson si está disponible)"""
+    if ijson is not None:
+        with open(path, 'rb') as f:
+            yield from ijson.items(f, 'item')
+    else:
+        yield from read_json(path)
+
+def iter_operations(path):
+    """Itera las operaciones de un operations.jsonl (una por línea) u operations.json (arreglo)"""
+    if path.suffix != '.jsonl':
+        yield from iter_json_items(path)
+        return
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield loads_json(line)
+            except ValueError:
+                # Última línea truncada si el proceso terminó a mitad de una escritura
+                continue
+
+def find_operations_file(session_dir):
+    """
+    Archivo de operaciones de una sesión
+    
+    operations.jsonl se escribe durante la sesión, así que también existe si
+    el proceso terminó sin cleanup_session; operations.json queda para
+    sesiones anteriores a ese formato.
+    """
+    for file_name in ("operations.jsonl", "operations.json"):
+        operations_file = session_dir / file_name
+        if operations_file.exists():
+            return operations_file
+    return session_dir / "operations.json"
 
 class RollbackManager:
     """
     Gestor de rollback para operaciones de consolidación
     """
     
-    def __init__(self, session_name=None):
+    def __init__(self, session_name=None, verbose=False):
         self.session_name = session_name
+        self.verbose = verbose
         self.logger = self.setup_logging()
         
         if session_name:
-            self.session_dir = f"execution_sessions/{session_name}"
-            self.operations_log = f"{self.session_dir}/operations.json"
+            self.session_dir = SESSIONS_DIR / session_name
         else:
             # Buscar la sesión más reciente
             self.session_dir, self.session_name = self.find_latest_session()
-            self.operations_log = f"{self.session_dir}/operations.json"
+        self.operations_log = find_operations_file(self.session_dir) if self.session_dir else None
         
-        self.logger.info(f"🔄 RollbackManager iniciado - Sesión: {self.session_name}")
-        self.logger.info(f"📁 Directorio de sesión: {self.session_dir}")
+        self.logger.info("🔄 RollbackManager iniciado - Sesión: %s", self.session_name)
+        self.logger.info("📁 Directorio de sesión: %s", self.session_dir)
     
     def setup_logging(self):
         """Configura el sistema de logging"""
@@ -51,192 +113,217 @@ class RollbackManager:
     
     def find_latest_session(self):
         """Encuentra la sesión más reciente"""
-        sessions_dir = "execution_sessions"
-        if not os.path.exists(sessions_dir):
+        if not SESSIONS_DIR.exists():
             self.logger.error("❌ No se encontró directorio de sesiones")
             return None, None
         
-        sessions = [d for d in os.listdir(sessions_dir) if os.path.isdir(os.path.join(sessions_dir, d))]
-        if not sessions:
+        # El nombre incluye el timestamp: la mayor es la más reciente (una pasada, sin lista)
+        with os.scandir(SESSIONS_DIR) as entries:
+            latest_session = max((entry.name for entry in entries if entry.is_dir()), default=None)
+        if latest_session is None:
             self.logger.error("❌ No se encontraron sesiones")
             return None, None
         
-        # Ordenar por nombre (que incluye timestamp)
-        sessions.sort(reverse=True)
-        latest_session = sessions[0]
-        latest_dir = os.path.join(sessions_dir, latest_session)
+        latest_dir = SESSIONS_DIR / latest_session
         
-        self.logger.info(f"📋 Sesión más reciente encontrada: {latest_session}")
+        self.logger.info("📋 Sesión más reciente encontrada: %s", latest_session)
         return latest_dir, latest_session
     
-    def load_operations(self):
-        """Carga las operaciones de la sesión"""
-        if not os.path.exists(self.operations_log):
-            self.logger.error(f"❌ No se encontró archivo de operaciones: {self.operations_log}")
-            return []
+    def load_operations(self, predicate=None):
+        """
+        Carga las operaciones de la sesión
+        
+        Con `predicate`, el filtro se aplica durante el parseo y solo se
+        materializan las operaciones que lo cumplen. Retorna None si el
+        archivo no existe o no se puede leer.
+        """
+        if not self.operations_log or not self.operations_log.exists():
+            self.logger.error("❌ No se encontró archivo de operaciones: %s", self.operations_log)
+            return None
         
         try:
-            with open(self.operations_log, 'r', encoding='utf-8') as f:
-                operations = json.load(f)
-            self.logger.info(f"📋 Cargadas {len(operations)} operaciones")
+            operations = [op for op in iter_operations(self.operations_log) if predicate is None or predicate(op)]
+            self.logger.info("📋 Cargadas %s operaciones", len(operations))
             return operations
         except Exception as e:
-            self.logger.error(f"❌ Error cargando operaciones: {str(e)}")
-            return []
+            self.logger.error("❌ Error cargando operaciones: %s", e)
+            return None
     
-    def rollback_silver_views(self, dry_run=True):
-        """Hace rollback de todas las vistas Silver creadas"""
-        operations = self.load_operations()
-        if not operations:
-            return False
+    def _drop_project_views(self, project_id, project_drops):
+        """
+        Ejecuta los DROP VIEW de un proyecto como un único script de BigQuery
         
-        # Filtrar operaciones de creación de vistas Silver
-        silver_operations = [
-            op for op in operations 
-            if (op['type'] == 'VIEW_CREATION' and 
-                op['status'] == 'SUCCESS' and
-                'vw_' in op['details'].get('view_name', ''))
-        ]
+        Si el script falla, las sentencias completadas se identifican por sus
+        jobs hijos y las restantes se envían como jobs individuales (todos
+        enviados antes de esperar resultados).
+        Retorna [(full_view_name, error o None)].
+        """
+        # Import diferido: list y los dry runs no cargan el cliente de BigQuery
+        from _bq import get_client
         
-        if not silver_operations:
-            self.logger.info("ℹ️  No se encontraron vistas Silver para hacer rollback")
-            return True
+        client = get_client(project_id)
+        query_job = None
+        
+        try:
+            query_job = client.query("\n".join(stmt for _, stmt in project_drops))
+            query_job.result()
+            return [(full_view_name, None) for full_view_name, _ in project_drops]
+        except Exception as e:
+            # Cada sentencia del script es un job hijo; los terminados sin error son vistas eliminadas
+            done, error = 0, str(e)
+            if query_job is not None:
+                children = sorted(client.list_jobs(parent_job=query_job), key=lambda job: job.created)
+                done = sum(1 for job in children if job.state == 'DONE' and job.error_result is None)
         
-        self.logger.info(f"🔄 Iniciando rollback de {len(silver_operations)} vistas Silver")
+        results = [(full_view_name, None) for full_view_name, _ in project_drops[:done]]
+        if done >= len(project_drops):
+            # Todas las sentencias terminaron pero el script falló igual: el error es del script completo
+            results.append((f"script de {project_id}", error))
+            return results
+        results.append((project_drops[done][0], error))
         
-        rollback_statements = []
-        successful_rollbacks = 0
-        failed_rollbacks = 0
+        # El script se detuvo antes de llegar a estas vistas
+        pending = []
+        for full_view_name, drop_statement in project_drops[done + 1:]:
+            try:
+                pending.append((full_view_name, client.query(drop_statement)))
+            except Exception as e:
+                results.append((full_view_name, str(e)))
         
-        for op in silver_operations:
-            details = op['details']
-            project_id = details['project_id']
-            dataset = details['dataset']
-            view_name = details['view_name']
-            
-            full_view_name = f"`{project_id}.{dataset}.{view_name}`"
-            drop_statement = f"DROP VIEW IF EXISTS {full_view_name};"
-            
-            rollback_statements.append(drop_statement)
-            
-            if not dry_run:
-                try:
-                    # Crear cliente BigQuery
-                    client = bigquery.Client(project=project_id)
-                    
-                    # Ejecutar DROP VIEW
-                    query_job = client.query(drop_statement)
-                    query_job.result()
-                    
-                    successful_rollbacks += 1
-                    self.logger.info(f"✅ Vista eliminada: {full_view_name}")
-                    
-                except Exception as e:
-                    failed_rollbacks += 1
-                    self.logger.error(f"❌ Error eliminando vista {full_view_name}: {str(e)}")
-            else:
-                self.logger.info(f"🔍 [DRY RUN] Eliminaría: {full_view_name}")
+        for full_view_name, job in pending:
+            try:
+                job.result()
+                results.append((full_view_name, None))
+            except Exception as e:
+                results.append((full_view_name, str(e)))
         
-        # Guardar script de rollback
-        rollback_script = f"{self.session_dir}/rollback_silver_views.sql"
-        with open(rollback_script, 'w', encoding='utf-8') as f:
-            f.write(f"-- Script de Rollback para Vistas Silver\n")
-            f.write(f"-- Sesión: {self.session_name}\n")
-            f.write(f"-- Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"-- Total de vistas: {len(rollback_statements)}\n\n")
-            
-            for stmt in rollback_statements:
-                f.write(stmt + "\n")
+        return results
+    
+    def _execute_drops(self, drops):
+        """
+        Ejecuta los DROP VIEW agrupados por proyecto, un proyecto por hilo
         
-        if dry_run:
-            self.logger.info(f"🔍 [DRY RUN] Se eliminarían {len(rollback_statements)} vistas Silver")
-            self.logger.info(f"📄 Script generado: {rollback_script}")
-        else:
-            self.logger.info(f"✅ Rollback completado: {successful_rollbacks} exitosas, {failed_rollbacks} fallidas")
+        `drops` es una lista de (project_id, full_view_name, drop_statement).
+        Retorna (exitosas, fallidas).
+        """
+        by_project = {}
+        for project_id, full_view_name, drop_statement in drops:
+            by_project.setdefault(project_id, []).append((full_view_name, drop_statement))
         
-        return failed_rollbacks == 0
+        successful = failed = 0
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = [
+                executor.submit(self._drop_project_views, project_id, project_drops)
+                for project_id, project_drops in by_project.items()
+            ]
+            
+            for future in as_completed(futures):
+                for full_view_name, error in future.result():
+                    if error is None:
+                        successful += 1
+                        if self.verbose:
+                            self.logger.info("✅ Vista eliminada: %s", full_view_name)
+                    else:
+                        failed += 1
+                        self.logger.error("❌ Error eliminando vista %s: %s", full_view_name, error)
+                    
+                    processed = successful + failed
+                    if not self.verbose and processed % PROGRESS_EVERY == 0:
+                        self.logger.info("⏳ Progreso: %s/%s vistas procesadas", processed, len(drops))
+        
+        return successful, failed
     
-    def rollback_consolidated_views(self, dry_run=True):
-        """Hace rollback de todas las vistas consolidadas creadas"""
-        operations = self.load_operations()
-        if not operations:
-            return False
+    def _rollback_views(self, view_prefix, label, title, script_basename, dry_run=True, operations=None):
+        """
+        Hace rollback de las vistas creadas cuyo nombre empieza con `view_prefix`
         
-        # Filtrar operaciones de creación de vistas consolidadas
-        consolidated_operations = [
-            op for op in operations 
-            if (op['type'] == 'VIEW_CREATION' and 
-                op['status'] == 'SUCCESS' and
-                'vw_consolidated_' in op['details'].get('view_name', ''))
-        ]
+        `operations` permite reutilizar operaciones ya cargadas; si es None se
+        leen del archivo de la sesión.
+        """
+        def is_view_creation(op):
+            return (op['type'] == 'VIEW_CREATION' and
+                    op['status'] == 'SUCCESS' and
+                    op['details'].get('view_name', '').startswith(view_prefix))
+        
+        if operations is None:
+            # Filtrar operaciones de creación de vistas durante el parseo
+            view_operations = self.load_operations(is_view_creation)
+            if view_operations is None:
+                return False
+        else:
+            view_operations = [op for op in operations if is_view_creation(op)]
         
-        if not consolidated_operations:
-            self.logger.info("ℹ️  No se encontraron vistas consolidadas para hacer rollback")
+        if not view_operations:
+            self.logger.info("ℹ️  No se encontraron vistas %s para hacer rollback", label)
             return True
         
-        self.logger.info(f"🔄 Iniciando rollback de {len(consolidated_operations)} vistas consolidadas")
+        self.logger.info("🔄 Iniciando rollback de %s vistas %s", len(view_operations), label)
         
-        rollback_statements = []
+        # Una sola pasada sobre las operaciones filtradas: (proyecto, vista, DROP)
+        drops = []
+        for op in view_operations:
+            details = op['details']
+            project_id = details['project_id']
+            full_view_name = "".join(("`", project_id, ".", details['dataset'], ".", details['view_name'], "`"))
+            drops.append((project_id, full_view_name, "".join((DROP_PREFIX, full_view_name, DROP_SUFFIX))))
+        
+        rollback_statements = [drop_statement for _, _, drop_statement in drops]
         successful_rollbacks = 0
         failed_rollbacks = 0
         
-        for op in consolidated_operations:
-            details = op['details']
-            project_id = details['project_id']
-            dataset = details['dataset']
-            view_name = details['view_name']
-            
-            full_view_name = f"`{project_id}.{dataset}.{view_name}`"
-            drop_statement = f"DROP VIEW IF EXISTS {full_view_name};"
-            
-            rollback_statements.append(drop_statement)
-            
-            if not dry_run:
-                try:
-                    # Crear cliente BigQuery
-                    client = bigquery.Client(project=project_id)
-                    
-                    # Ejecutar DROP VIEW
-                    query_job = client.query(drop_statement)
-                    query_job.result()
-                    
-                    successful_rollbacks += 1
-                    self.logger.info(f"✅ Vista eliminada: {full_view_name}")
-                    
-                except Exception as e:
-                    failed_rollbacks += 1
-                    self.logger.error(f"❌ Error eliminando vista {full_view_name}: {str(e)}")
-            else:
-                self.logger.info(f"🔍 [DRY RUN] Eliminaría: {full_view_name}")
+        if dry_run:
+            # El detalle por vista queda en el script .sql; en consola solo con --verbose
+            if self.verbose:
+                for _, full_view_name, _ in drops:
+                    self.logger.info("🔍 [DRY RUN] Eliminaría: %s", full_view_name)
+        else:
+            successful_rollbacks, failed_rollbacks = self._execute_drops(drops)
         
         # Guardar script de rollback
-        rollback_script = f"{self.session_dir}/rollback_consolidated_views.sql"
-        with open(rollback_script, 'w', encoding='utf-8') as f:
-            f.write(f"-- Script de Rollback para Vistas Consolidadas\n")
-            f.write(f"-- Sesión: {self.session_name}\n")
-            f.write(f"-- Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"-- Total de vistas: {len(rollback_statements)}\n\n")
-            
-            for stmt in rollback_statements:
-                f.write(stmt + "\n")
+        rollback_script = self.session_dir / f"{script_basename}.sql"
+        header = (
+            f"-- Script de Rollback para Vistas {title}\n"
+            f"-- Sesión: {self.session_name}\n"
+            f"-- Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+            f"-- Total de vistas: {len(rollback_statements)}\n\n"
+        ).encode('utf-8')
+        # Los nombres de dataset/vista pueden incluir caracteres Unicode
+        body = ("\n".join(rollback_statements) + "\n").encode('utf-8')
+        with open(rollback_script, 'wb') as f:
+            f.write(header + body)
         
         if dry_run:
-            self.logger.info(f"🔍 [DRY RUN] Se eliminarían {len(rollback_statements)} vistas consolidadas")
-            self.logger.info(f"📄 Script generado: {rollback_script}")
+            self.logger.info("🔍 [DRY RUN] Se eliminarían %s vistas %s", len(rollback_statements), label)
+            self.logger.info("📄 Script generado: %s", rollback_script)
         else:
-            self.logger.info(f"✅ Rollback completado: {successful_rollbacks} exitosas, {failed_rollbacks} fallidas")
+            self.logger.info("✅ Rollback completado: %s exitosas, %s fallidas", successful_rollbacks, failed_rollbacks)
         
         return failed_rollbacks == 0
     
+    def rollback_silver_views(self, dry_run=True, operations=None):
+        """Hace rollback de todas las vistas Silver creadas"""
+        return self._rollback_views('vw_', 'Silver', 'Silver', 'rollback_silver_views', dry_run, operations)
+    
+    def rollback_consolidated_views(self, dry_run=True, operations=None):
+        """Hace rollback de todas las vistas consolidadas creadas"""
+        return self._rollback_views('vw_consolidated_', 'consolidadas', 'Consolidadas', 'rollback_consolidated_views', dry_run, operations)
+    
     def rollback_all(self, dry_run=True):
         """Hace rollback de todas las operaciones"""
-        self.logger.info(f"🔄 Iniciando rollback completo {'(DRY RUN)' if dry_run else ''}")
+        self.logger.info("🔄 Iniciando rollback completo %s", '(DRY RUN)' if dry_run else '')
+        
+        # Las operaciones se parsean una sola vez para ambos rollbacks
+        operations = self.load_operations()
+        if not operations:
+            # Sin archivo o sin operaciones: no hay nada que revertir en ninguno de los dos pasos
+            self.logger.error("❌ Rollback completo sin operaciones que revertir")
+            return False
         
         # Rollback de vistas consolidadas primero (dependencias)
-        consolidated_success = self.rollback_consolidated_views(dry_run)
+        consolidated_success = self.rollback_consolidated_views(dry_run, operations)
         
         # Rollback de vistas Silver
-        silver_success = self.rollback_silver_views(dry_run)
+        silver_success = self.rollback_silver_views(dry_run, operations)
         
         if dry_run:
             self.logger.info("🔍 [DRY RUN] Rollback completo simulado")
@@ -248,33 +335,102 @@ class RollbackManager:
         
         return consolidated_success and silver_success
     
+    def summarize_operations(self, operations_file):
+        """Cuenta operaciones, exitosas y fallidas de un operations.json(l) en una sola pasada"""
+        if operations_file.suffix == '.jsonl':
+            # Una operación por línea (JSON compacto): solo se parsea la primera;
+            # el status se cuenta con búsqueda de bytes, sin parsear el resto
+            operations_count = successful_ops = failed_ops = 0
+            start_time = None
+            with open(operations_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    if operations_count == 0:
+                        start_time = loads_json(line)['timestamp']
+                    operations_count += 1
+                    successful_ops += b'"status":"SUCCESS"' in line
+                    failed_ops += b'"status":"FAILED"' in line
+        else:
+            # Streaming: no se construye la lista de operaciones
+            operations_count = successful_ops = failed_ops = 0
+            start_time = None
+            for op in iter_json_items(operations_file):
+                if operations_count == 0:
+                    start_time = op['timestamp']
+                operations_count += 1
+                successful_ops += op['status'] == 'SUCCESS'
+                failed_ops += op['status'] == 'FAILED'
+        
+        return {
+            'operations_count': operations_count,
+            'successful_ops': successful_ops,
+            'failed_ops': failed_ops,
+            'start_time': start_time
+        }
+    
     def list_sessions(self):
         """Lista todas las sesiones disponibles"""
-        sessions_dir = "execution_sessions"
-        if not os.path.exists(sessions_dir):
+        if not SESSIONS_DIR.exists():
             self.logger.info("ℹ️  No se encontró directorio de sesiones")
             return []
         
-        sessions = []
-        for session_name in os.listdir(sessions_dir):
-            session_path = os.path.join(sessions_dir, session_name)
-            if os.path.isdir(session_path):
-                operations_file = os.path.join(session_path, "operations.json")
-                if os.path.exists(operations_file):
-                    try:
-                        with open(operations_file, 'r', encoding='utf-8') as f:
-                            operations = json.load(f)
-                        
-                        sessions.append({
-                            'name': session_name,
-                            'path': session_path,
-                            'operations_count': len(operations),
-                            'successful_ops': len([op for op in operations if op['status'] == 'SUCCESS']),
-                            'failed_ops': len([op for op in operations if op['status'] == 'FAILED']),
-                            'start_time': operations[0]['timestamp'] if operations else None
-                        })
-                    except:
-                        continue
+        # Resúmenes ya calculados, válidos mientras no cambie el mtime de operations.json
+        cache_file = SESSIONS_DIR / LIST_CACHE_FILE
+        try:
+            cache = read_json(cache_file)
+        except Exception:
+            cache = {}
+        new_cache = {}
+        
+        with os.scandir(SESSIONS_DIR) as entries:
+            session_entries = [entry for entry in entries if entry.is_dir()]
+        
+        # Las sesiones sin resumen vigente se parsean en paralelo (I/O independiente por archivo)
+        to_parse = []
+        for entry in session_entries:
+            # operations.jsonl (escrito por ExecutionManager durante la sesión) si existe;
+            # si no, el operations.json de sesiones anteriores. El stat da existencia y mtime a la vez
+            for file_name in ("operations.jsonl", "operations.json"):
+                operations_file = Path(entry.path, file_name)
+                try:
+                    mtime = operations_file.stat().st_mtime
+                    break
+                except OSError:
+                    continue
+            else:
+                continue
+            
+            cached = cache.get(entry.name)
+            if cached is not None and cached.get('mtime') == mtime:
+                new_cache[entry.name] = cached
+            else:
+                to_parse.append((entry.name, operations_file, mtime))
+        
+        with ThreadPoolExecutor(max_workers=LIST_WORKERS) as executor:
+            futures = {
+                executor.submit(self.summarize_operations, operations_file): (session_name, mtime)
+                for session_name, operations_file, mtime in to_parse
+            }
+            for future in as_completed(futures):
+                session_name, mtime = futures[future]
+                try:
+                    new_cache[session_name] = {'mtime': mtime, 'summary': future.result()}
+                except Exception:
+                    continue
+        
+        sessions = [
+            {'name': entry.name, 'path': entry.path, **new_cache[entry.name]['summary']}
+            for entry in session_entries
+            if entry.name in new_cache
+        ]
+        
+        if new_cache != cache:
+            try:
+                with open(cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(new_cache, f)
+            except OSError as e:
+                self.logger.warning("⚠️  No se pudo guardar el cache de sesiones: %s", e)
         
         # Ordenar por nombre (timestamp)
         sessions.sort(key=lambda x: x['name'], reverse=True)
@@ -312,6 +468,7 @@ def main():
         print("  execute <script_file>   - Ejecuta un script de rollback específico")
         print("\nOpciones:")
         print("  --execute               - Ejecuta realmente (no dry run)")
+        print("  --verbose               - Registra cada vista (por defecto solo progreso y resumen)")
         print("\nEjemplos:")
         print("  python rollback_manager.py list")
         print("  python rollback_manager.py silver")
@@ -322,17 +479,20 @@ def main():
     command = sys.argv[1].lower()
     session_name = None
     dry_run = True
+    verbose = False
     
     # Procesar argumentos
     if len(sys.argv) > 2:
         for arg in sys.argv[2:]:
             if arg == '--execute':
                 dry_run = False
+            elif arg == '--verbose':
+                verbose = True
             elif not arg.startswith('--'):
                 session_name = arg
     
     # Crear gestor de rollback
-    manager = RollbackManager(session_name)
+    manager = RollbackManager(session_name, verbose)
     
     if not manager.session_name:
         print("❌ No se pudo determinar la sesión para rollback")
@@ -6,217 +6,204 @@ Script de prueba para analizar una sola tabla y generar su vista Silver.
 Útil para probar la lógica antes de ejecutar el script completo.
 """
 
-from google.cloud import bigquery
+import argparse
+import io
 import pandas as pd
 from datetime import datetime
-import warnings
-from collections import defaultdict, Counter
-warnings.filterwarnings('ignore')
+from _silver_common import MAX_COMPANIES_FOR_TEST, bronze_dataset, dry_run_sql, get_companies_info, get_all_table_fields
 
-# Configuración
-PROJECT_SOURCE = "platform-partners-qua"
-DATASET_NAME = "settings"
-TABLE_NAME = "companies"
-TEST_TABLE = "call"  # Tabla de prueba
-MAX_COMPANIES_FOR_TEST = 5
-
-# Crear cliente BigQuery
-client = bigquery.Client(project=PROJECT_SOURCE)
-print(f"✅ Cliente BigQuery creado para proyecto: {PROJECT_SOURCE}")
-
-def get_companies_info():
-    """Obtiene información de las compañías activas"""
-    query = f"""
-        SELECT company_id, company_name, company_project_id
-        FROM `{PROJECT_SOURCE}.{DATASET_NAME}.{TABLE_NAME}`
-        WHERE company_bigquery_status IS NOT NULL
-        ORDER BY company_id
-        LIMIT {MAX_COMPANIES_FOR_TEST}  # Solo las primeras 5 para prueba
+def analyze_table_fields(table_name, max_companies=MAX_COMPANIES_FOR_TEST, refresh=False):
     """
-    return pd.DataFrame([dict(row) for row in client.query(query).result()])
-
-def get_table_fields_with_types(project_id, table_name):
-    dataset_name = f"servicetitan_{project_id.replace('-', '_')}"
-    query = f"""
-        SELECT column_name, data_type, is_nullable, ordinal_position
-        FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.COLUMNS`
-        WHERE table_name = '{table_name}'
-        ORDER BY ordinal_position
+    Analiza campos comunes, parciales y conflictos de tipo de una tabla entre compañías
+    
+    Retorna None si ninguna compañía tiene la tabla.
     """
-    try:
-        return pd.DataFrame([dict(row) for row in client.query(query).result()])
-    except:
-        return pd.DataFrame()
-
-# Obtener compañías de prueba
-companies = get_companies_info()
-print(f"📋 Compañías de prueba: {len(companies)}")
-
-# Analizar la tabla
-results = []
-all_fields = set()
-
-for _, company in companies.iterrows():
-    project_id = company['company_project_id']
-    company_name = company['company_name']
-    
-    fields_df = get_table_fields_with_types(project_id, TEST_TABLE)
-    
-    if fields_df.empty:
-        print(f"  ⚠️  {company_name}: Tabla '{TEST_TABLE}' no encontrada")
-        continue
-    
-    # Filtrar campos _fivetran (campos del ETL que deben quedarse solo en Bronze)
-    filtered_fields_df = fields_df[~fields_df['column_name'].str.startswith('_fivetran')]
-    fields = filtered_fields_df['column_name'].tolist()
-    all_fields.update(fields)
-    
-    results.append({
-        'company_name': company_name,
-        'project_id': project_id,
-        'fields': fields,
-        'field_count': len(fields),
-        'fields_df': filtered_fields_df
-    })
-    
-    print(f"  ✅ {company_name}: {len(fields)} campos")
-
-if not results:
-    print(f"❌ No se encontraron datos para la tabla '{TEST_TABLE}'")
-    exit()
-
-# Analizar campos comunes y únicos
-field_frequency = Counter()
-for result in results:
-    field_frequency.update(result['fields'])
-
-total_companies = len(results)
-common_fields = []
-partial_fields = []
-
-for field, count in field_frequency.items():
-    if count == total_companies:
-        common_fields.append(field)
-    else:
-        partial_fields.append(field)
-
-print(f"\n📊 ANÁLISIS DE CAMPOS PARA '{TEST_TABLE}':")
-print(f"  Total de compañías: {total_companies}")
-print(f"  Total de campos únicos: {len(all_fields)}")
-print(f"  Campos comunes: {len(common_fields)}")
-print(f"  Campos parciales: {len(partial_fields)}")
-
-print(f"\n✅ CAMPOS COMUNES:")
-for field in sorted(common_fields):
-    print(f"    - {field}")
-
-print(f"\n⚠️  CAMPOS PARCIALES:")
-for field in sorted(partial_fields):
-    count = field_frequency[field]
-    print(f"    - {field}: {count}/{total_companies} compañías")
-
-# Analizar tipos de datos
-print(f"\n🔍 ANALIZANDO TIPOS DE DATOS...")
-field_type_analysis = defaultdict(list)
-
-for result in results:
-    company_name = result['company_name']
-    project_id = result['project_id']
-    fields_df = result['fields_df']
-    
-    for _, field in fields_df.iterrows():
-        field_name = field['column_name']
-        data_type = field['data_type']
+    companies = get_companies_info(max_companies, refresh=refresh)
+    print(f"📋 Compañías de prueba: {len(companies)}")
+    
+    # Analizar la tabla (un solo job de metadata para todas las compañías)
+    results = []
+    all_fields = set()
+    fields_by_company = get_all_table_fields(companies, table_name)
+    
+    for _, company in companies.iterrows():
+        project_id = company['company_project_id']
+        company_name = company['company_name']
+        
+        columns = fields_by_company.get(company['company_id'])
+        
+        if columns is None:
+            print(f"  ⚠️  {company_name}: Tabla '{table_name}' no encontrada")
+            continue
         
-        field_type_analysis[field_name].append({
+        fields = [column[0] for column in columns]
+        all_fields.update(fields)
+        
+        results.append({
             'company_name': company_name,
             'project_id': project_id,
-            'data_type': data_type
+            'fields': fields,
+            'field_count': len(fields),
+            'columns': columns
         })
-
-# Detectar conflictos de tipo
-type_conflicts = {}
-field_consensus = {}
-
-for field_name, type_info_list in field_type_analysis.items():
-    unique_types = list(set([info['data_type'] for info in type_info_list]))
-    
-    if len(unique_types) > 1:
-        type_conflicts[field_name] = {
-            'types': unique_types,
-            'companies': type_info_list
-        }
-    else:
-        field_consensus[field_name] = {
-            'type': unique_types[0],
-            'companies': type_info_list
+        
+        print(f"  ✅ {company_name}: {len(fields)} campos")
+    
+    if not results:
+        return None
+    
+    # Analizar campos comunes y únicos (una sola reducción sobre todos los campos).
+    # El único DataFrame del análisis se arma desde las tuplas de cada compañía.
+    all_df = pd.DataFrame.from_records(
+        (
+            (result['company_name'], result['project_id'], column_name, data_type)
+            for result in results
+            for column_name, data_type, *_ in result['columns']
+        ),
+        columns=['company_name', 'project_id', 'column_name', 'data_type']
+    )
+    field_frequency = all_df.groupby('column_name').size()
+    
+    total_companies = len(results)
+    common_fields = []
+    partial_fields = []
+    
+    # Una sola pasada reparte cada campo en comunes o parciales
+    for field, count in field_frequency.items():
+        (common_fields if count == total_companies else partial_fields).append(field)
+    
+    # Se ordenan una sola vez; el listado y la generación de SQL usan estas listas
+    common_fields.sort()
+    partial_fields.sort()
+    
+    print(f"\n📊 ANÁLISIS DE CAMPOS PARA '{table_name}':")
+    print(f"  Total de compañías: {total_companies}")
+    print(f"  Total de campos únicos: {len(all_fields)}")
+    print(f"  Campos comunes: {len(common_fields)}")
+    print(f"  Campos parciales: {len(partial_fields)}")
+    
+    print(f"\n✅ CAMPOS COMUNES:")
+    for field in common_fields:
+        print(f"    - {field}")
+    
+    print(f"\n⚠️  CAMPOS PARCIALES:")
+    for field in partial_fields:
+        count = field_frequency[field]
+        print(f"    - {field}: {count}/{total_companies} compañías")
+    
+    # Analizar tipos de datos (agregación vectorizada sobre all_df)
+    print(f"\n🔍 ANALIZANDO TIPOS DE DATOS...")
+    type_summary = all_df.groupby('column_name', sort=False)['data_type'].agg(['nunique', 'unique'])
+    has_conflict = type_summary['nunique'] > 1
+    
+    field_consensus = {
+        field_name: {'type': types[0]}
+        for field_name, types in type_summary.loc[~has_conflict, 'unique'].items()
+    }
+    
+    # Detalle por compañía solo para los campos en conflicto (pocos)
+    conflict_rows = all_df[all_df['column_name'].isin(type_summary.index[has_conflict])]
+    type_conflicts = {
+        field_name: {
+            'types': list(type_summary.at[field_name, 'unique']),
+            'companies': rows[['company_name', 'project_id', 'data_type']].to_dict('records')
         }
-
-print(f"\n📊 ANÁLISIS DE TIPOS:")
-print(f"  Campos sin conflicto: {len(field_consensus)}")
-print(f"  Campos con conflicto: {len(type_conflicts)}")
-
-if type_conflicts:
-    print(f"\n⚠️  CONFLICTOS DE TIPO:")
-    for field_name, conflict in type_conflicts.items():
-        print(f"    - {field_name}: {', '.join(conflict['types'])}")
-        for info in conflict['companies']:
-            print(f"        {info['company_name']}: {info['data_type']}")
-
-# Generar SQL de ejemplo para la primera compañía
-if results:
-    first_company = results[0]
-    company_fields = set(first_company['fields'])
-    
-    # Generar SQL
-    sql_fields = []
-    
-    # Campos comunes
-    for field in sorted(common_fields):
-        sql_fields.append(f"    {field}")
-    
-    # Campos parciales con COALESCE
-    for field in sorted(partial_fields):
-        if field in company_fields:
-            sql_fields.append(f"    {field}")
-        else:
-            sql_fields.append(f"    NULL as {field}")
-    
-    # Metadata fields
-    sql_fields.append(f"    '{first_company['project_id']}' as source_project")
-    sql_fields.append(f"    CURRENT_TIMESTAMP() as silver_processed_at")
-    sql_fields.append(f"    '{first_company['company_name']}' as company_name")
-    
-    # Crear SQL
-    project_id = first_company['project_id']
-    company_name = first_company['company_name']
-    dataset_name = f"servicetitan_{project_id.replace('-', '_')}"
-    
-    sql = f"""-- Vista Silver para {company_name} - Tabla {TEST_TABLE}
+        for field_name, rows in conflict_rows.groupby('column_name', sort=False)
+    }
+    
+    print(f"\n📊 ANÁLISIS DE TIPOS:")
+    print(f"  Campos sin conflicto: {len(field_consensus)}")
+    print(f"  Campos con conflicto: {len(type_conflicts)}")
+    
+    if type_conflicts:
+        print(f"\n⚠️  CONFLICTOS DE TIPO:")
+        for field_name, conflict in type_conflicts.items():
+            print(f"    - {field_name}: {', '.join(conflict['types'])}")
+            for info in conflict['companies']:
+                print(f"        {info['company_name']}: {info['data_type']}")
+    
+    return {
+        'table_name': table_name,
+        'results': results,
+        'common_fields': common_fields,
+        'partial_fields': partial_fields,
+        'field_consensus': field_consensus,
+        'type_conflicts': type_conflicts
+    }
+
+def generate_silver_view_sql(analysis, company_result):
+    """Genera el SQL de la vista Silver de prueba para una compañía"""
+    table_name = analysis['table_name']
+    company_fields = set(company_result['fields'])
+    
+    project_id = company_result['project_id']
+    company_name = company_result['company_name']
+    dataset_name = bronze_dataset(project_id)
+    
+    # Campos comunes, parciales (NULL si la compañía no los tiene) y metadata.
+    # Las listas del análisis ya vienen ordenadas.
+    select_lines = [f"    {field}" for field in analysis['common_fields']]
+    select_lines.extend(
+        f"    {field}" if field in company_fields else f"    NULL as {field}"
+        for field in analysis['partial_fields']
+    )
+    select_lines.extend([
+        f"    '{project_id}' as source_project",
+        f"    CURRENT_TIMESTAMP() as silver_processed_at",
+        f"    '{company_name}' as company_name"
+    ])
+    
+    # Crear SQL escribiendo cada parte en un buffer
+    buffer = io.StringIO()
+    buffer.write(f"""-- Vista Silver para {company_name} - Tabla {table_name}
 -- Generada automáticamente el {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
-CREATE OR REPLACE VIEW `{project_id}.silver.vw_{TEST_TABLE}` AS (
+CREATE OR REPLACE VIEW `{project_id}.silver.vw_{table_name}` AS (
 SELECT
-{chr(10).join(sql_fields)}
-FROM `{project_id}.{dataset_name}.{TEST_TABLE}`
+""")
+    buffer.write(",\n".join(select_lines))
+    buffer.write(f"""
+FROM `{project_id}.{dataset_name}.{table_name}`
 );
-"""
+""")
+    return buffer.getvalue()
+
+def main(test_table="call", max_companies=MAX_COMPANIES_FOR_TEST, refresh=False):
+    """Función principal para ejecutar análisis de prueba"""
+    print("🧪 Ejecutando análisis de tabla individual...")
+    
+    analysis = analyze_table_fields(test_table, max_companies, refresh)
+    
+    if analysis is None:
+        print(f"❌ No se encontraron datos para la tabla '{test_table}'")
+        return False
+    
+    # Generar SQL de ejemplo para la primera compañía
+    sql = generate_silver_view_sql(analysis, analysis['results'][0])
     
     print(sql)
     
     # Guardar en archivo
-    with open(f"test_{TEST_TABLE}_silver_view.sql", 'w') as f:
+    with open(f"test_{test_table}_silver_view.sql", 'w') as f:
         f.write(sql)
     
-    print(f"\n💾 SQL guardado en: test_{TEST_TABLE}_silver_view.sql")
-
-print(f"\n✅ Prueba completada!")
-
-def main():
-    """Función principal para ejecutar análisis de prueba"""
-    print("🧪 Ejecutando análisis de tabla individual...")
-    # El código principal ya se ejecutó arriba
+    print(f"\n💾 SQL guardado en: test_{test_table}_silver_view.sql")
+    
+    # Validar el SQL generado antes de aplicarlo en producción
+    bytes_processed, error = dry_run_sql(sql)
+    if error is not None:
+        print(f"\n❌ SQL inválido (dry run): {error}")
+        return False
+    
+    print(f"\n✅ SQL válido (dry run): {bytes_processed:,} bytes estimados")
+    print(f"\n✅ Prueba completada!")
     return True
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Analiza una tabla entre compañías y genera su vista Silver de prueba")
+    parser.add_argument("table", nargs="?", default="call", help="Tabla a analizar (default: call)")
+    parser.add_argument("--all-companies", action="store_true", help=f"Analizar todas las compañías, no solo las primeras {MAX_COMPANIES_FOR_TEST}")
+    parser.add_argument("--refresh", action="store_true", help="Ignorar el cache local de compañías")
+    args = parser.parse_args()
+    
+    main(args.table, None if args.all_companies else MAX_COMPANIES_FOR_TEST, args.refresh)
@@ -4,26 +4,15 @@ Script para verificar tipos de UN campo específico en todas las compañías
 """
 
 from google.cloud import bigquery
-import pandas as pd
-from config import PROJECT_SOURCE
+from _bq import get_client, metadata_job_config
+from _companies_cache import load_companies
 
-client = bigquery.Client(project=PROJECT_SOURCE)
+client = get_client()
 
 def analyze_specific_field(table_name, field_name):
     """Analiza un campo específico en todas las compañías"""
     
-    query = f"""
-        SELECT
-            company_name,
-            company_project_id
-        FROM `{PROJECT_SOURCE}.settings.companies`
-        WHERE company_fivetran_status = TRUE
-          AND company_bigquery_status = TRUE
-          AND company_project_id IS NOT NULL
-        ORDER BY company_id
-    """
-    
-    companies_df = pd.DataFrame([dict(row) for row in client.query(query).result()])
+    companies_df = load_companies()
     
     print(f"\n{'='*80}")
     print(f"ANÁLISIS DE CAMPO ESPECÍFICO")
@@ -34,43 +23,61 @@ def analyze_specific_field(table_name, field_name):
     
     results = []
     
-    for _, company in companies_df.iterrows():
-        company_name = company['company_name']
-        project_id = company['company_project_id']
-        dataset_name = f"servicetitan_{project_id.replace('-', '_')}"
-        
-        try:
-            query = f"""
+    # Una sola consulta UNION ALL sobre el INFORMATION_SCHEMA de todas las compañías
+    selects = []
+    for idx, company in enumerate(companies_df.itertuples(index=False)):
+        project_id = company.company_project_id
+        dataset_name = company.dataset_name
+        selects.append(f"""
                 SELECT
+                    {idx} AS idx,
                     data_type
                 FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.COLUMNS`
-                WHERE table_name = '{table_name}'
-                  AND column_name = '{field_name}'
-            """
-            
-            result = client.query(query).result()
-            rows = list(result)
-            
-            if rows:
-                data_type = rows[0].data_type
-                results.append({
-                    'company_name': company_name,
-                    'project_id': project_id,
-                    'data_type': data_type,
-                    'has_field': True
-                })
-                print(f"✅ {company_name:30} → {data_type}")
-            else:
-                results.append({
-                    'company_name': company_name,
-                    'project_id': project_id,
-                    'data_type': None,
-                    'has_field': False
-                })
-                print(f"⚠️  {company_name:30} → CAMPO NO EXISTE")
-                
-        except Exception as e:
-            print(f"❌ {company_name:30} → Error: {str(e)}")
+                WHERE table_name = @table_name
+                  AND column_name = @field_name
+            """)
+    
+    job_config = metadata_job_config([
+        bigquery.ScalarQueryParameter("table_name", "STRING", table_name),
+        bigquery.ScalarQueryParameter("field_name", "STRING", field_name),
+    ])
+    
+    try:
+        data_types = {row.idx: row.data_type for row in client.query("UNION ALL".join(selects), job_config=job_config).result()}
+        failed = {}
+    except Exception:
+        # Un dataset inválido hace fallar el lote: se consulta por compañía para aislar el error
+        data_types, failed = {}, {}
+        for idx, select in enumerate(selects):
+            try:
+                for row in client.query(select, job_config=job_config).result():
+                    data_types[row.idx] = row.data_type
+            except Exception as e:
+                failed[idx] = e
+    
+    for idx, company in enumerate(companies_df.itertuples(index=False)):
+        company_name = company.company_name
+        project_id = company.company_project_id
+        
+        if idx in failed:
+            print(f"❌ {company_name:30} → Error: {str(failed[idx])}")
+        elif idx in data_types:
+            data_type = data_types[idx]
+            results.append({
+                'company_name': company_name,
+                'project_id': project_id,
+                'data_type': data_type,
+                'has_field': True
+            })
+            print(f"✅ {company_name:30} → {data_type}")
+        else:
+            results.append({
+                'company_name': company_name,
+                'project_id': project_id,
+                'data_type': None,
+                'has_field': False
+            })
+            print(f"⚠️  {company_name:30} → CAMPO NO EXISTE")
     
     # Resumen
     print(f"\n{'='*80}")
@@ -3,29 +3,37 @@
 Script de diagnóstico para verificar detección de conflictos de tipos
 """
 
-from google.cloud import bigquery
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+from _bq import get_client, fetch_columns
+from _companies_cache import load_companies
 from config import PROJECT_SOURCE
 
-client = bigquery.Client(project=PROJECT_SOURCE)
+# Consultas concurrentes contra BigQuery
+MAX_WORKERS = 20
+
+client = get_client()
 
 def get_companies_info():
     """Obtiene lista de compañías activas"""
-    query = f"""
-        SELECT
-            company_id,
-            company_name,
-            company_project_id
-        FROM `{PROJECT_SOURCE}.settings.companies`
-        WHERE company_fivetran_status = TRUE
-          AND company_bigquery_status = TRUE
-          AND company_project_id IS NOT NULL
-        ORDER BY company_id
-    """
+    return load_companies()
+
+def _fetch_fields(company, table_name):
+    """Obtiene los campos y tipos de la tabla en el dataset de una compañía"""
+    company_name = company.company_name
+    project_id = company.company_project_id
+    dataset_name = company.dataset_name
     
-    query_job = client.query(query)
-    results = query_job.result()
-    return pd.DataFrame([dict(row) for row in results])
+    try:
+        columns_df = fetch_columns(project_id, dataset_name)
+        fields_df = columns_df.loc[
+            (columns_df['table_name'] == table_name)
+            & ~columns_df['column_name'].str.startswith('_fivetran'),
+            ['column_name', 'data_type']
+        ]
+        return company_name, project_id, fields_df, None
+    except Exception as e:
+        return company_name, project_id, None, str(e)
 
 def analyze_specific_table(table_name):
     """Analiza tipos de datos de una tabla específica"""
@@ -36,49 +44,40 @@ def analyze_specific_table(table_name):
     companies_df = get_companies_info()
     print(f"✅ Total de compañías activas: {len(companies_df)}\n")
     
-    field_types = {}
+    company_fields = []
     companies_with_table = []
     
-    for _, company in companies_df.iterrows():
-        company_name = company['company_name']
-        project_id = company['company_project_id']
-        dataset_name = f"servicetitan_{project_id.replace('-', '_')}"
+    # Los esquemas se consultan en paralelo; la agregación se hace en este hilo
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(_fetch_fields, company, table_name)
+            for company in companies_df.itertuples(index=False)
+        ]
         
-        try:
-            query = f"""
-                SELECT
-                    column_name,
-                    data_type
-                FROM `{project_id}.{dataset_name}.INFORMATION_SCHEMA.COLUMNS`
-                WHERE table_name = '{table_name}'
-                  AND column_name NOT LIKE '_fivetran%'
-                ORDER BY ordinal_position
-            """
-            
-            query_job = client.query(query)
-            results = query_job.result()
-            fields_df = pd.DataFrame([dict(row) for row in results])
+        for future in futures:
+            company_name, project_id, fields_df, error = future.result()
             
-            if not fields_df.empty:
+            if error is not None:
+                print(f"❌ {company_name}: Error - {error}")
+            elif not fields_df.empty:
                 companies_with_table.append(company_name)
                 print(f"✅ {company_name} ({project_id})")
                 
-                for _, field in fields_df.iterrows():
-                    field_name = field['column_name']
-                    data_type = field['data_type']
-                    
-                    if field_name not in field_types:
-                        field_types[field_name] = {}
-                    
-                    if data_type not in field_types[field_name]:
-                        field_types[field_name][data_type] = []
-                    
-                    field_types[field_name][data_type].append(company_name)
+                company_fields.append(fields_df.assign(company_name=company_name))
             else:
                 print(f"⚠️  {company_name}: Tabla no encontrada")
-                
-        except Exception as e:
-            print(f"❌ {company_name}: Error - {str(e)}")
+    
+    # Agrupación (campo, tipo) -> compañías en pandas, en orden de primera aparición
+    field_types = {}
+    conflicting = set()
+    if company_fields:
+        all_fields = pd.concat(company_fields, ignore_index=True)
+        grouped = all_fields.groupby(['column_name', 'data_type'], sort=False)['company_name'].agg(list)
+        type_counts = grouped.index.get_level_values('column_name').value_counts()
+        conflicting = set(type_counts.index[type_counts > 1])
+        
+        for (field_name, data_type), companies in grouped.items():
+            field_types.setdefault(field_name, {})[data_type] = companies
     
     print(f"\n{'='*80}")
     print(f"RESUMEN DE ANÁLISIS")
@@ -94,7 +93,7 @@ def analyze_specific_table(table_name):
     print(f"{'='*80}\n")
     
     for field_name, types_dict in field_types.items():
-        if len(types_dict) > 1:
+        if field_name in conflicting:
             # HAY CONFLICTO
             conflicts_found.append(field_name)
             print(f"⚠️  CAMPO: {field_name}")